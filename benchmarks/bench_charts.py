@@ -0,0 +1,61 @@
+import numpy as np
+import plotly.io as pio
+import pytest
+
+import charts
+import figure_cache
+import profiling
+
+
+@pytest.mark.benchmark(group = 'grid')
+@pytest.mark.parametrize('renderer', sorted(charts.GRID_RENDERERS))
+@pytest.mark.parametrize('metric', charts.METRICS)
+def test_make_grid(benchmark, data, renderer, metric):
+    benchmark(charts.GRID_RENDERERS[renderer], data['grid_values'], metric, charts.color(metric))
+
+
+@pytest.mark.benchmark(group = 'bar chart')
+@pytest.mark.parametrize('metric', charts.METRICS)
+def test_make_bar_chart(benchmark, data, metric):
+    benchmark(charts.make_bar_chart, data['combined_data'], metric, charts.color(metric))
+
+
+@pytest.mark.benchmark(group = 'timeline')
+@pytest.mark.parametrize('renderer', sorted(charts.GRID_FRAMES))
+def test_make_timeline_grid(benchmark, data, renderer):
+    benchmark(charts.make_timeline_grid, data['timeline_values'], 'CR', charts.color('CR'), renderer)
+
+
+@pytest.mark.benchmark(group = 'timeline')
+def test_make_timeline_bar_chart(benchmark, data):
+    benchmark(charts.make_timeline_bar_chart, data['timeline_values'], 'CR', charts.color('CR'))
+
+
+# The memory ceiling in covid-prisons.py counts what the caches hold now, so evicted and cleared entries drop out
+def test_cached_sizes_follow_evictions(data, monkeypatch):
+    monkeypatch.setattr(figure_cache, 'MAX_ENTRIES', 2)
+    figure_cache.clear()
+    figures = [figure_cache.get('bar', metric, 'v', lambda: charts.make_bar_chart(data['combined_data'], metric, charts.color(metric)))
+               for metric in charts.METRICS]
+    assert figure_cache.nbytes() == sum(len(pio.to_json(figure)) for figure in figures[-2:])
+    figure_cache.clear()
+    assert figure_cache.nbytes() == 0
+
+    for version in ['v1', 'v2', 'v3']:
+        profiling.cache_size('test_loader', version, data['grid_values'], 2)
+    assert profiling.cached_bytes() == 2 * profiling.memory_report(data['grid_values'])['session_bytes'] > 0
+    profiling.cache_forget('test_loader')
+    assert profiling.cached_bytes() == 0
+
+
+# A window with no new cases or deaths anywhere has a maximum of 0; NaN when no state has the series
+@pytest.mark.parametrize('fill', [0.0, np.nan])
+def test_tile_grid_with_no_maximum(data, fill):
+    values = dict(data['grid_values'])
+    values['Prison_MR7'] = np.full_like(values['Prison_MR7'], fill)
+    values['State_MR7'] = np.full_like(values['State_MR7'], fill)
+    values['max_MR7'] = charts._maximum(values, 'MR7')
+    charts.make_tile_grid(values, 'MR7', charts.color('MR7'))
+    timeline = {key: value[np.newaxis] if isinstance(value, np.ndarray) else value for key, value in values.items()}
+    timeline['dates'] = ['12-30-2020']
+    charts.make_timeline_grid(timeline, 'MR7', charts.color('MR7'), 'tiles')
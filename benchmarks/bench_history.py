@@ -0,0 +1,161 @@
+import os
+
+import pandas as pd
+import pytest
+
+import history
+import pipeline
+import snapshots
+from conftest import FIXTURE_DIR, Upstream
+
+# Incremental ingest of the prison-case history (history.py) against the Range/ETag stand-in: after each change
+# upstream, the ingested history must equal a from-scratch parse of what upstream serves
+
+
+@pytest.fixture
+def weeks(upstream, monkeypatch):
+    # Every ingest goes to upstream
+    monkeypatch.setattr(snapshots, 'MAX_AGE', 0)
+    with open(os.path.join(FIXTURE_DIR, 'covid_prison_cases.csv'), 'rb') as f:
+        lines = f.read().splitlines(keepends = True)
+    blocks = {}
+    for line in lines[1:]:
+        blocks.setdefault(line.split(b',')[16], []).append(line)
+    # The header, then one block of lines per reporting week
+    return [lines[0]] + [b''.join(block) for block in blocks.values()]
+
+
+def path():
+    return os.path.join(Upstream.directory, 'covid_prison_cases.csv')
+
+
+def publish(body):
+    with open(path(), 'wb') as f:
+        f.write(body)
+
+
+def ingest():
+    return history.ingest('covid_prison_cases', pipeline.COVID_PRISON_DATA_URL)
+
+
+# From-scratch parse of what upstream serves, or of body
+def reference(body = None):
+    source = path()
+    if body is not None:
+        source = path() + '.expected'
+        with open(source, 'wb') as f:
+            f.write(body)
+    return history._indexed(history._parse(source, 0, None, history.CHUNKSIZE))
+
+
+def assert_current(result, body = None):
+    pd.testing.assert_frame_equal(result, reference(body), check_dtype = False)
+
+
+def meta():
+    return snapshots.metadata(history.HISTORY_NAME)
+
+
+def test_unchanged_source_is_not_modified(weeks):
+    publish(b''.join(weeks))
+    assert_current(ingest())
+    assert_current(ingest())
+    assert Upstream.fetches['covid_prison_cases.csv'] == 1 and Upstream.statuses[304] == 1
+
+
+def test_appended_weeks_are_fetched_as_a_tail(weeks):
+    publish(b''.join(weeks[:-2]))
+    ingest()
+    publish(b''.join(weeks[:-1]))
+    assert_current(ingest())
+    publish(b''.join(weeks))
+    assert_current(ingest())
+    assert Upstream.fetches['covid_prison_cases.csv'] == 1
+    assert len(meta()['segments']) == 3 and meta()['segments'][-1]['end'] == os.path.getsize(path())
+
+    # Two weeks in one refresh
+    publish(b''.join(weeks[:-2]))
+    ingest()
+    publish(b''.join(weeks))
+    assert_current(ingest())
+    assert len(meta()['segments']) == 2
+
+
+def test_unterminated_last_line(weeks):
+    publish(b''.join(weeks[:-1]))
+    ingest()
+    first, rest = weeks[-1].split(b'\n', 1)
+    # Cut off mid-row: the tail is only that row, which waits until it is complete
+    publish(b''.join(weeks[:-1]) + first[:20])
+    assert_current(ingest(), b''.join(weeks[:-1]))
+    assert meta()['partial_sha256'] is None
+    # Every field there but the newline: ingested now, and again once the line is complete
+    publish(b''.join(weeks[:-1]) + first.rstrip(b'\r'))
+    assert_current(ingest())
+    assert meta()['partial_sha256'] is not None
+    publish(b''.join(weeks))
+    assert_current(ingest())
+    assert meta()['partial_sha256'] is None
+    assert Upstream.fetches['covid_prison_cases.csv'] == 1
+
+
+def test_header_change_rebuilds(weeks):
+    publish(b''.join(weeks[:-1]))
+    ingest()
+    # Upstream adds a column; the rows already there are untouched and the new week has the extra field. A shortened
+    # column name keeps the header the same length, so the bytes in the boundary window do not move.
+    header = weeks[0].replace(b'staff_tests_with_multiples', b'staff_tests_with_multi').replace(b',notes\r\n', b',notes,vax\r\n')
+    assert len(header) == len(weeks[0])
+    appended = weeks[-1].replace(b',\r\n', b',,1\r\n')
+    publish(header + b''.join(weeks[1:-1]) + appended)
+    assert_current(ingest())
+    assert Upstream.fetches['covid_prison_cases.csv'] == 2
+    assert meta()['header'][-1] == 'vax'
+
+
+def test_early_revision_waits_for_the_full_check(weeks, monkeypatch):
+    publish(b''.join(weeks))
+    ingest()
+    # Same length, in the first week: outside the boundary window, so a tail fetch cannot see it
+    revised = weeks[1].replace(b'Alabama,AL,,,,,,,,,,819,', b'Alabama,AL,,,,,,,,,,918,', 1)
+    assert revised != weeks[1]
+    publish(weeks[0] + revised + b''.join(weeks[2:]))
+    stale = ingest()
+    assert stale.loc[(pd.Timestamp('2020-04-01'), 'Alabama'), 'total_prisoner_cases'] == 819
+    monkeypatch.setattr(history, 'FULL_CHECK_AGE', 0)
+    assert_current(ingest())
+    assert Upstream.fetches['covid_prison_cases.csv'] == 2
+
+
+def test_boundary_revision_rebuilds(weeks):
+    publish(b''.join(weeks[:-1]))
+    ingest()
+    # A late report revised in the last ingested week, and a new week appended
+    revised = weeks[-2].replace(b',\r\n', b',revised\r\n', 1)
+    publish(b''.join(weeks[:-2]) + revised + weeks[-1])
+    assert_current(ingest())
+    assert Upstream.fetches['covid_prison_cases.csv'] == 2
+
+
+def test_truncated_source_rebuilds(weeks):
+    publish(b''.join(weeks))
+    ingest()
+    # Shorter than the boundary window's start: a 416, then the whole file
+    publish(b''.join(weeks[:2]))
+    assert_current(ingest())
+    assert Upstream.statuses[416] == 1 and Upstream.fetches['covid_prison_cases.csv'] == 2
+    # A little shorter: the ranged response ends before what was ingested
+    publish(b''.join(weeks))
+    ingest()
+    publish(b''.join(weeks)[:-100])
+    assert_current(ingest())
+
+
+def test_server_without_range_support(weeks):
+    Upstream.ranges = False
+    publish(b''.join(weeks[:-1]))
+    ingest()
+    publish(b''.join(weeks))
+    assert_current(ingest())
+    # The whole file came back, so the prefix was verified and only the new week parsed
+    assert Upstream.fetches['covid_prison_cases.csv'] == 2 and len(meta()['segments']) == 2
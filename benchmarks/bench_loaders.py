@@ -0,0 +1,66 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+import make_fixtures
+import prison_data
+import states
+import time_series
+
+
+@pytest.mark.benchmark(group = 'loaders')
+def test_load_prison_pop_data(benchmark):
+    benchmark(prison_data.load_prison_pop_data)
+
+
+@pytest.mark.benchmark(group = 'loaders')
+def test_load_covid_prison_data(benchmark, data):
+    benchmark(prison_data.load_covid_prison_data, data['prison_pop_data'])
+
+
+@pytest.mark.benchmark(group = 'loaders')
+def test_load_covid_data(benchmark, data):
+    benchmark(prison_data.load_covid_data, data['data_date'])
+
+
+@pytest.mark.benchmark(group = 'loaders')
+def test_load_timeline(benchmark, data):
+    benchmark(prison_data.load_timeline, data['prison_pop_data'])
+
+
+@pytest.mark.benchmark(group = 'loaders')
+def test_load_time_series(benchmark):
+    benchmark(time_series.load)
+
+
+# County rows add up to their state, 'Unassigned' and 'Out of <state>' rows included; D.C., territories and cruise
+# ships drop out
+def test_time_series_state_totals(tmp_path):
+    rows = [('Alabama', 'County 1', 100, [1, 2]), ('Alabama', 'County 2', 50, [2, 3]), ('Alabama', 'Unassigned', 0, [3, 4]),
+            ('Alabama', 'Out of AL', 0, [5, 6]), ('Wyoming', 'Unassigned', 0, [10, 20]), ('District of Columbia', 'District of Columbia', 700, [100, 100]),
+            ('Puerto Rico', 'Unassigned', 0, [100, 100]), ('Diamond Princess', '', 0, [7, 7])]
+    path = os.path.join(tmp_path, 'time_series_covid19_deaths_US.csv')
+    with open(path, 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(make_fixtures.TIME_SERIES_HEADER + ['Population', '1/22/20', '1/23/20'])
+        for name, admin2, population, counts in rows:
+            writer.writerow([0, 'US', 'USA', 840, '', admin2, name, 'US', 0.0, 0.0, admin2 + ', ' + name + ', US', population] + counts)
+
+    series = time_series.load_measure(path, chunksize = 3)
+    assert list(series['dates'].strftime('%m/%d/%y')) == ['01/22/20', '01/23/20']
+    expected = np.zeros((2, len(states.STATE_CODES)), dtype = np.int32)
+    expected[:, states.STATE_CODES.get_loc('AL')] = [11, 15]
+    expected[:, states.STATE_CODES.get_loc('WY')] = [10, 20]
+    np.testing.assert_array_equal(series['values'], expected)
+    assert series['population'][states.STATE_CODES.get_loc('AL')] == 150
+    assert series['population'].sum() == 150
+
+
+# Rows past the 50 states (federal prisons) drop out by name, not by position
+def test_prison_populations_are_the_states():
+    prison_pop_data = prison_data.load_prison_pop_data()
+    assert list(prison_pop_data.index) == list(states.INDEX)
+    assert prison_pop_data['dec_pop'].iloc[-1] == prison_pop_data['dec_pop'].iloc[:-1].sum()
+    assert 'Federal' not in set(prison_pop_data['name'])
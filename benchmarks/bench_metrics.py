@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import charts
+import metrics
+import prison_data
+import states
+from conftest import FIXTURE_DIR
+
+
+# The rates as the loaders computed them inline, before the shared metrics module, straight from the fixture CSVs, one
+# formula per column in state order; NATIONWIDE is left to the tests below
+def reference():
+    population = pd.read_csv(os.path.join(FIXTURE_DIR, 'prison_populations.csv')).set_index('name')['dec_pop']
+    prison = pd.read_csv(os.path.join(FIXTURE_DIR, 'covid_prison_cases.csv'))
+    prison['as_of_date'] = pd.to_datetime(prison['as_of_date'])
+    prison = prison[prison['as_of_date'] == prison['as_of_date'].max()].set_index('name')
+    report = pd.read_csv(os.path.join(FIXTURE_DIR, '12-30-2020.csv')).set_index('Province_State')
+    names = states.STATES['name'][:-1]
+    cases = prison['total_prisoner_cases'].reindex(names).to_numpy(dtype = np.float64)
+    deaths = prison['total_prisoner_deaths'].reindex(names).to_numpy(dtype = np.float64)
+    dec_pop = population.reindex(names).to_numpy(dtype = np.float64)
+    report = report.reindex(names)
+    state_population = (report['Confirmed'] * 100000 / report['Incident_Rate']).astype(int).to_numpy(dtype = np.float64)
+    return {
+        'cases': cases, 'deaths': deaths, 'dec_pop': dec_pop,
+        'Confirmed': report['Confirmed'].to_numpy(dtype = np.float64), 'Deaths': report['Deaths'].to_numpy(dtype = np.float64),
+        'Incident_Rate': report['Incident_Rate'].to_numpy(dtype = np.float64), 'Mortality_Rate': report['Mortality_Rate'].to_numpy(dtype = np.float64),
+        'Prison_CR': cases * 100000 / dec_pop,
+        'Prison_MR': deaths * 100000 / dec_pop,
+        'Prison_CFR': deaths * 100000 / cases,
+        'State_CR': report['Incident_Rate'].to_numpy(dtype = np.float64),
+        'State_CFR': report['Mortality_Rate'].to_numpy(dtype = np.float64) * 1000,
+        'population': state_population,
+        'State_MR': report['Deaths'].to_numpy(dtype = np.float64) * 100000 / state_population,
+    }
+
+
+def test_per_state_rates_match_pre_engine(data):
+    ref = reference()
+    prison = metrics.prison_metrics(ref['cases'], ref['deaths'], ref['dec_pop'])
+    state = metrics.state_metrics(ref['Confirmed'], ref['Deaths'], ref['Incident_Rate'], ref['Mortality_Rate'])
+    for column, values in list(prison.items()) + list(state.items()):
+        if column in ref:
+            np.testing.assert_allclose(values[:-1], ref[column], rtol = 1e-12, err_msg = column)
+    # Alabama, by hand: 32767 cases and 327 deaths among 112680 prisoners; 1969954 confirmed and 32832 deaths statewide
+    assert prison['Prison_CR'][0] == pytest.approx(32767 * 100000 / 112680)
+    assert prison['Prison_CFR'][0] == pytest.approx(327 * 100000 / 32767)
+    assert state['State_CFR'][0] == pytest.approx(1666.637901189571)
+    assert state['population'][0] == 23965379
+    # The loaders serve the same values, in float32
+    for frame, columns in (('covid_prison_data', ['Prison_CR', 'Prison_MR', 'Prison_CFR']), ('covid_data', ['State_CR', 'State_MR', 'State_CFR'])):
+        for column in columns:
+            np.testing.assert_allclose(prison_data.numbers(data[frame][column].iloc[:-1]), ref[column], rtol = 1e-6, err_msg = column)
+
+
+# NATIONWIDE comes from the summed counts and denominators. The pre-engine loader divided the prison counts by
+# prison_pop_data.sum(0) after appending its own NATIONWIDE row, i.e. by twice the population, halving CR and MR.
+def test_nationwide_rates():
+    ref = reference()
+    prison = metrics.prison_metrics(ref['cases'], ref['deaths'], ref['dec_pop'])
+    state = metrics.state_metrics(ref['Confirmed'], ref['Deaths'], ref['Incident_Rate'], ref['Mortality_Rate'])
+    cases, deaths, population = ref['cases'].sum(), ref['deaths'].sum(), ref['dec_pop'].sum()
+    assert prison['Prison_CR'][-1] == pytest.approx(cases * 100000 / population)
+    assert prison['Prison_CR'][-1] == pytest.approx(2 * cases * 100000 / (population + population))
+    assert prison['Prison_MR'][-1] == pytest.approx(deaths * 100000 / population)
+    assert prison['Prison_CFR'][-1] == pytest.approx(deaths * 100000 / cases)
+    assert state['population'][-1] == ref['population'].sum()
+    assert state['State_CR'][-1] == pytest.approx(ref['Confirmed'].sum() * 100000 / ref['population'].sum())
+    assert state['State_MR'][-1] == pytest.approx(ref['Deaths'].sum() * 100000 / ref['population'].sum())
+    assert state['State_CFR'][-1] == pytest.approx(ref['Deaths'].sum() * 100000 / ref['Confirmed'].sum())
+
+
+# Leading axes broadcast: a (dates, states) pass gives row for row what one call per date does
+def test_rates_broadcast_over_dates():
+    ref = reference()
+    cases = np.stack([ref['cases'] / 2, ref['cases']])
+    deaths = np.stack([ref['deaths'] / 2, ref['deaths']])
+    stacked = metrics.prison_metrics(cases, deaths, ref['dec_pop'])
+    for i in range(2):
+        for column, values in metrics.prison_metrics(cases[i], deaths[i], ref['dec_pop']).items():
+            assert stacked[column].shape == (2, len(states.INDEX))
+            np.testing.assert_array_equal(stacked[column][i], values, err_msg = column)
+    confirmed = np.stack([ref['Confirmed'] / 2, ref['Confirmed']])
+    stacked = metrics.state_metrics(confirmed, np.stack([ref['Deaths'] / 2, ref['Deaths']]), np.stack([ref['Incident_Rate'] / 2, ref['Incident_Rate']]),
+                                    np.stack([ref['Mortality_Rate'], ref['Mortality_Rate']]))
+    single = metrics.state_metrics(ref['Confirmed'], ref['Deaths'], ref['Incident_Rate'], ref['Mortality_Rate'])
+    for column, values in single.items():
+        np.testing.assert_array_equal(stacked[column][1], values, err_msg = column)
+
+
+@pytest.mark.benchmark(group = 'metrics')
+def test_prison_metrics(benchmark, data):
+    covid_prison_data = data['covid_prison_data'].iloc[:-1]
+    population = data['prison_pop_data']['dec_pop'].iloc[:-1]
+    benchmark(metrics.prison_metrics, covid_prison_data['total_prisoner_cases'].to_numpy(),
+              covid_prison_data['total_prisoner_deaths'].to_numpy(), population.to_numpy())
+
+
+@pytest.mark.benchmark(group = 'metrics')
+def test_state_metrics(benchmark, data):
+    covid_data = data['covid_data'].iloc[:-1]
+    benchmark(metrics.state_metrics, covid_data['Confirmed'].to_numpy(), covid_data['Deaths'].to_numpy(),
+              covid_data['State_CR'].to_numpy(), covid_data['State_CFR'].to_numpy() / 1000)
+
+
+@pytest.mark.benchmark(group = 'join')
+def test_combine(benchmark, data):
+    benchmark(prison_data.combine, data['covid_prison_data'], data['covid_data'])
+
+
+@pytest.mark.benchmark(group = 'join')
+def test_grid_values(benchmark, data):
+    benchmark(charts.grid_values, data['combined_data'])
+
+
+# A state that missed its latest weekly report has no window ending on it: missing, not "no new cases", and NATIONWIDE
+# is the rate over the states that did report
+def test_window_rates_skip_missed_reports():
+    dates = pd.to_datetime(['2020-04-01', '2020-04-08', '2020-04-15', '2020-04-22'])
+    cases = np.array([[100, 100], [200, 200], [400, 300], [np.nan, 400]])
+    rates = prison_data.window_rates('Prison_', dates, cases, cases / 100, np.array([100000.0, 100000.0]), dates)
+    cr7, cr14 = rates['Prison_CR7'], rates['Prison_CR14']
+    assert np.isnan(cr7[3, 0]) and np.isnan(cr14[3, 0])
+    assert cr7[3, 1] == 100 and cr14[3, 1] == 200
+    assert cr7[3, 2] == 100 and cr14[3, 2] == 200
+    assert cr7[2, 0] == 200 and cr14[2, 0] == 300
+    assert cr14[2, 2] == (300 + 200) / 2
+    assert np.isnan(cr7[0]).all()
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import charts
+import dataset
+import figure_cache
+import prison_data
+import profiling
+import refresher
+import single_flight
+import snapshots
+from conftest import DELAY, Upstream, sessions
+
+
+@pytest.fixture
+def background(upstream, monkeypatch):
+    # Every refresh revalidates the sources against the stand-in
+    monkeypatch.setattr(snapshots, 'MAX_AGE', 0)
+    figure_cache.clear()
+    refresher.start(interval = 3600)
+    yield upstream
+    refresher.stop()
+    figure_cache.clear()
+
+
+def misses(name):
+    return profiling.cache_stats().get(name, {'misses': 0})['misses']
+
+
+def refreshed():
+    while 'dataset.refresh' in single_flight.in_flight():
+        time.sleep(0.01)
+
+
+def unbuilt():
+    pytest.fail('figure was not built with the version')
+
+
+def test_requests_never_wait_for_the_next_version(background):
+    # Cold start: the first request waits for the refresher's first frames, and the figures follow
+    before = {name: misses(name) for name in ('dataset.source', 'dataset.load', 'dataset.timeline')}
+    first = dataset.load()
+    version = first['dataset_version']
+    refreshed()
+    for metric in charts.ALL_METRICS:
+        figure_cache.get('bar', metric, version, unbuilt)
+    # That wait and the build are misses; the requests after it are hits
+    assert {name: misses(name) - count for name, count in before.items()} == {'dataset.source': 1, 'dataset.load': 1, 'dataset.timeline': 1}
+    fetched = sum(Upstream.fetches.values())
+    assert all(result is first for result in sessions(dataset.load))
+    assert sum(Upstream.fetches.values()) == fetched
+
+    # Upstream publishes new prison populations; requests keep the published version while the next one builds
+    path = os.path.join(Upstream.directory, 'prison_populations.csv')
+    with open(path) as f:
+        body = f.read()
+    with open(path, 'w') as f:
+        f.write(body.replace('112680', '112681'))
+    building = threading.Thread(target = dataset.refresh, args = (refresher.prepare_figures,))
+    building.start()
+    while 'dataset.refresh' not in single_flight.in_flight():
+        time.sleep(0.01)
+    start = time.perf_counter()
+    during = dataset.load()
+    assert time.perf_counter() - start < DELAY
+    assert during is first
+    building.join()
+
+    after = dataset.load()
+    assert misses('dataset.load') - before['dataset.load'] == 2
+    assert after['dataset_version'] != version
+    assert after['prison_pop_data'].loc['AL', 'dec_pop'] == 112681
+    assert after is not first and dataset.timeline(after) is dataset.timeline(after)
+
+
+def test_cold_start_waits_only_for_the_frames(upstream, monkeypatch):
+    monkeypatch.setattr(snapshots, 'MAX_AGE', 0)
+    figure_cache.clear()
+    release = threading.Event()
+    load_timeline = prison_data.load_timeline
+    monkeypatch.setattr(prison_data, 'load_timeline', lambda *args: release.wait() and load_timeline(*args))
+    # A request that arrives before the refresher's first refresh waits for it instead of running one without figures
+    monkeypatch.setattr(dataset, 'BACKGROUND', True)
+    results = []
+    request = threading.Thread(target = lambda: results.append(dataset.load()))
+    request.start()
+    time.sleep(DELAY)
+    refresher.start(interval = 3600)
+    try:
+        request.join(timeout = 30)
+        # Served while the timeline values are still being built
+        assert results and not release.is_set()
+        release.set()
+        refreshed()
+        version = results[0]['dataset_version']
+        for metric in charts.ALL_METRICS:
+            figure_cache.get('bar', metric, version, unbuilt)
+            figure_cache.get('grid-' + refresher.GRID_RENDERER, metric, version, unbuilt)
+        assert dataset.timeline(results[0]) is dataset.timeline(results[0])
+    finally:
+        release.set()
+        refresher.stop()
+        figure_cache.clear()
+
+
+def test_failed_cold_start_fails_the_waiting_requests(upstream, monkeypatch):
+    monkeypatch.setattr(refresher, 'RETRY_INTERVAL', 1)
+    Upstream.failing.add('prison_populations.csv')
+    refresher.start(interval = 3600)
+    try:
+        with pytest.raises(urllib.error.HTTPError):
+            dataset.load()
+        # Retried well before the refresh interval
+        Upstream.failing.clear()
+        deadline = time.time() + 30
+        while not dataset.published() and time.time() < deadline:
+            time.sleep(0.05)
+        assert dataset.load()['dataset_version'] == dataset.source()[1]
+    finally:
+        refresher.stop()
+        figure_cache.clear()
@@ -0,0 +1,37 @@
+import os
+import urllib.error
+
+import dataset
+import history
+import pipeline
+import snapshots
+from conftest import Upstream, sessions
+
+
+def test_cold_sessions_fetch_each_source_once(upstream):
+    results = sessions(dataset.load)
+    assert all(result is results[0] for result in results)
+    assert dict(Upstream.fetches) == {
+        'prison_populations.csv': 1,
+        'covid_prison_cases.csv': 1,
+        results[0]['data_date'] + '.csv': 1,
+        'time_series_covid19_confirmed_US.csv': 1,
+        'time_series_covid19_deaths_US.csv': 1,
+    }
+
+
+def test_concurrent_refreshes_share_one_download(upstream):
+    results = sessions(snapshots.refresh, 'prison_populations', pipeline.PRISON_POP_DATA_URL)
+    assert len(set(results)) == 1 and os.path.exists(results[0])
+    assert Upstream.fetches['prison_populations.csv'] == 1
+
+    results = sessions(history.ingest, 'covid_prison_cases', pipeline.COVID_PRISON_DATA_URL)
+    assert all(result is results[0] for result in results)
+    assert Upstream.fetches['covid_prison_cases.csv'] == 1
+
+
+def test_failures_are_shared(upstream):
+    Upstream.failing.add('prison_populations.csv')
+    results = sessions(dataset.load)
+    assert all(isinstance(result, urllib.error.HTTPError) for result in results)
+    assert Upstream.fetches['prison_populations.csv'] == 1
@@ -0,0 +1,159 @@
+import collections
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import charts
+import dataset
+import history
+import pipeline
+import prison_data
+import snapshots
+
+# Every benchmark reads the local fixtures; nothing touches the network
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+snapshots.OFFLINE = True
+snapshots.SNAPSHOT_DIR = FIXTURE_DIR
+
+
+@pytest.fixture(scope = 'session')
+def data():
+    prison_history = history.ingest('covid_prison_cases', pipeline.COVID_PRISON_DATA_URL)
+    data_date = history.latest_date(prison_history).strftime('%m-%d-%Y')
+    prison_pop_data = prison_data.load_prison_pop_data()
+    covid_prison_data = prison_data.load_covid_prison_data(prison_pop_data)
+    covid_data = prison_data.load_covid_data(data_date)
+    combined_data = prison_data.combine(covid_prison_data, covid_data)
+    return {
+        'data_date': data_date,
+        'prison_pop_data': prison_pop_data,
+        'covid_prison_data': covid_prison_data,
+        'covid_data': covid_data,
+        'combined_data': combined_data,
+        'grid_values': charts.grid_values(combined_data),
+        'timeline_values': charts.timeline_values(prison_data.load_timeline(prison_pop_data)),
+    }
+
+
+# Local stand-in for the upstream servers, for the tests that go through the network code
+# It serves a copy of the fixtures (Upstream.directory, which a test may edit to publish new data) slowly enough that
+# concurrent sessions all arrive while the first fetch is still in flight, and counts the downloads of each file and the
+# status of every response. Responses carry an ETag of the file's content and honour If-None-Match; Range requests get
+# a 206 (416 past the end) unless Upstream.ranges is False, which makes it a server that always sends the whole file.
+SESSIONS = 16
+DELAY = 0.2
+
+
+class Upstream(SimpleHTTPRequestHandler):
+    directory = FIXTURE_DIR
+    fetches = collections.Counter()
+    statuses = collections.Counter()
+    failing = set()
+    ranges = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory = Upstream.directory, **kwargs)
+
+    def do_GET(self):
+        name = os.path.basename(self.path)
+        path = os.path.join(Upstream.directory, name)
+        # Range requests (the prison-case date peek, history tail and header checks) are not downloads of the source
+        ranged = 'Range' in self.headers and Upstream.ranges
+        if not ranged:
+            Upstream.fetches[name] += 1
+        time.sleep(DELAY)
+        if name in Upstream.failing:
+            self.send_error(500)
+        elif not os.path.exists(path):
+            self.send_error(404)
+        else:
+            with open(path, 'rb') as f:
+                body = f.read()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+            elif ranged:
+                self.send_range(body, etag, self.headers['Range'])
+            else:
+                self.send_body(200, body, etag)
+
+    def send_response(self, code, message = None):
+        Upstream.statuses[code] += 1
+        super().send_response(code, message)
+
+    def send_body(self, code, body, etag, headers = ()):
+        self.send_response(code)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # bytes=<start>-[<end>] or bytes=-<suffix length>, as the peek and history ask for
+    def send_range(self, body, etag, byte_range):
+        start, end = byte_range.split('=')[1].split('-')
+        start, end = (max(0, len(body) - int(end)), len(body) - 1) if start == '' else (int(start), min(int(end), len(body) - 1) if end else len(body) - 1)
+        if start >= len(body):
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */' + str(len(body)))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(206, body[start:end + 1], etag, [('Content-Range', 'bytes ' + str(start) + '-' + str(end) + '/' + str(len(body)))])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    Upstream.directory = str(tmp_path / 'upstream')
+    shutil.copytree(FIXTURE_DIR, Upstream.directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    base = 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
+    monkeypatch.setattr(snapshots, 'OFFLINE', False)
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(pipeline, 'PRISON_POP_DATA_URL', base + 'prison_populations.csv')
+    monkeypatch.setattr(pipeline, 'COVID_PRISON_DATA_URL', base + 'covid_prison_cases.csv')
+    monkeypatch.setattr(pipeline, 'COVID_DATA_BASE_URL', base)
+    monkeypatch.setattr(pipeline, 'TIME_SERIES_BASE_URL', base)
+    Upstream.fetches.clear()
+    Upstream.statuses.clear()
+    Upstream.failing.clear()
+    Upstream.ranges = True
+    dataset.clear()
+    yield base
+    dataset.clear()
+    server.shutdown()
+    server.server_close()
+
+
+# Run function in SESSIONS threads released at once; returns each one's result or exception
+def sessions(function, *args):
+    barrier = threading.Barrier(SESSIONS)
+    results = [None] * SESSIONS
+
+    def session(i):
+        barrier.wait()
+        try:
+            results[i] = function(*args)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target = session, args = (i,)) for i in range(SESSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import make_fixtures
+import schemas
+import snapshots
+
+# Parse time of each source with the schema registry (snapshots.parse_csv: columns by header name, registered dtypes)
+# against the parser it replaces (read_csv with the C engine inferring every column's dtype, then the columns renamed
+# by position and selected), on full-size synthetic files: every weekly prison report through mid-2021 and one JHU
+# daily report per day over the same span, which is what daily_reports.py backfills. The schema path is timed with
+# each engine forced and with the size-based choice parse_csv makes (snapshots.PYARROW_MIN_BYTES). The last row is a
+# prison-case history LARGE times as long, to show where the pyarrow engine starts to pay off.
+WEEKS = 65
+LARGE = 20
+REPEAT = 5
+
+# The positional header lists the loaders used before the registry
+PRISON_POP_NAMES = make_fixtures.PRISON_POP_HEADER
+DAILY_REPORT_NAMES = make_fixtures.DAILY_REPORT_HEADER
+
+
+def positional(path, names, usecols):
+    data = pd.read_csv(path)
+    data = data.iloc[:, :len(names)].set_axis(names[:data.shape[1]], axis = 1)
+    return data[usecols].reset_index(drop = True)
+
+
+# parse_csv over paths with ENGINE and PYARROW_MIN_BYTES set as given; min_bytes 0 forces the engine
+def parse_all(paths, schema, engine, min_bytes):
+    previous = snapshots.ENGINE, snapshots.PYARROW_MIN_BYTES
+    snapshots.ENGINE, snapshots.PYARROW_MIN_BYTES = engine, min_bytes
+    try:
+        for path in paths:
+            snapshots.parse_csv(path, schema)
+    finally:
+        snapshots.ENGINE, snapshots.PYARROW_MIN_BYTES = previous
+
+
+def best(function, *args):
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare the schema-registry CSV parser with the positional one it replaces')
+    parser.add_argument('--weeks', type = int, default = WEEKS, help = 'weekly prison-case reports (and days of daily reports) to synthesize')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_fixtures.synthesize(directory, args.weeks, True, 0)
+        reports = sorted(os.path.join(directory, name) for name in os.listdir(directory) if schemas.schema(name[:-len('.csv')]) is schemas.DAILY_REPORT)
+        large = os.path.join(directory, 'large')
+        os.makedirs(large)
+        make_fixtures.synthesize(large, args.weeks * LARGE, False, 0)
+        sources = [
+            ('prison_populations', [os.path.join(directory, 'prison_populations.csv')], schemas.PRISON_POPULATIONS, PRISON_POP_NAMES),
+            ('covid_prison_cases', [os.path.join(directory, 'covid_prison_cases.csv')], schemas.COVID_PRISON_CASES, make_fixtures.PRISON_CASES_HEADER),
+            (str(len(reports)) + ' daily reports', reports, schemas.DAILY_REPORT, DAILY_REPORT_NAMES),
+            ('covid_prison_cases ' + str(LARGE) + 'x', [os.path.join(large, 'covid_prison_cases.csv')], schemas.COVID_PRISON_CASES,
+             make_fixtures.PRISON_CASES_HEADER),
+        ]
+        if snapshots.ENGINE != 'pyarrow':
+            print('pyarrow is not installed; only the C engine is timed')
+        engines = ['c', 'pyarrow'] if snapshots.ENGINE == 'pyarrow' else ['c']
+        print(format('source', '24') + format('MB', '>7') + format('positional ms', '>16') + ''.join(format(engine + ' ms', '>12') for engine in engines)
+              + format('auto ms', '>12'))
+        for label, paths, schema, names in sources:
+            size = sum(os.path.getsize(path) for path in paths) / 2 ** 20
+            row = [best(lambda: [positional(path, names, list(schema)) for path in paths])]
+            row += [best(parse_all, paths, schema, engine, 0) for engine in engines]
+            row.append(best(parse_all, paths, schema, snapshots.ENGINE, snapshots.PYARROW_MIN_BYTES))
+            print(format(label, '24') + format(size, '7.2f') + format(row[0] * 1000, '16.1f') + ''.join(format(seconds * 1000, '12.1f') for seconds in row[1:]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import charts
+import states
+
+# Compare the grid renderers in charts.GRID_RENDERERS
+# Prints construction time and serialized JSON size per renderer and metric, and writes an HTML page that times
+# Plotly.newPlot for each figure in the browser (client render time can only be measured there).
+
+PAGE = '''<html>
+<head><meta charset="utf-8"><script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script></head>
+<body>
+<pre id="results">renderer  metric  render ms (median of %(runs)d)\n</pre>
+<div id="plot"></div>
+<script>
+const figures = %(figures)s;
+const runs = %(runs)d;
+const results = document.getElementById('results');
+(async () => {
+    for (const [label, figure] of Object.entries(figures)) {
+        const times = [];
+        for (let i = 0; i < runs; i++) {
+            Plotly.purge('plot');
+            const start = performance.now();
+            await Plotly.newPlot('plot', figure.data, figure.layout);
+            times.push(performance.now() - start);
+        }
+        times.sort((a, b) => a - b);
+        results.textContent += label + '  ' + times[Math.floor(runs / 2)].toFixed(1) + '\\n';
+    }
+})();
+</script>
+</body>
+</html>
+'''
+
+
+# Grid values for a fixed random dataset; construction cost does not depend on the numbers themselves
+def sample_values():
+    rng = np.random.default_rng(0)
+    combined_data = pd.DataFrame({'name': states.STATES['name'].to_numpy()}, index = states.INDEX)
+    for metric in charts.METRICS:
+        combined_data['Prison_' + metric] = rng.uniform(100, 5000, len(states.INDEX))
+        combined_data['State_' + metric] = rng.uniform(100, 5000, len(states.INDEX))
+    return charts.grid_values(combined_data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the grid renderers')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--html', default = 'grid_renderers.html', help = 'where to write the client render-time page')
+    args = parser.parse_args()
+
+    values = sample_values()
+    figures = {}
+    print('renderer  metric  build ms  json KB  traces')
+    for renderer, make_grid in charts.GRID_RENDERERS.items():
+        for metric in charts.METRICS:
+            make_grid(values, metric, charts.color(metric))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                grid = make_grid(values, metric, charts.color(metric))
+            build = (time.perf_counter() - start) / args.repeat
+            serialized = pio.to_json(grid)
+            figures[renderer + ' ' + metric] = serialized
+            print(format(renderer, '9') + ' ' + format(metric, '6') + '  ' + format(build * 1000, '8.1f') + '  '
+                  + format(len(serialized) / 1024, '7.1f') + '  ' + format(len(grid.data), '6d'))
+
+    with open(args.html, 'w') as f:
+        f.write(PAGE % {'runs': args.repeat, 'figures': '{' + ', '.join('"' + label + '": ' + serialized for label, serialized in figures.items()) + '}'})
+    print('open ' + args.html + ' in a browser for client render times')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import urllib.request
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pipeline
+import states
+
+# Write the benchmark fixtures: prison_populations.csv, covid_prison_cases.csv, the JHU daily report(s) for the
+# prison-case dates and the JHU US time series, with the upstream file names and headers
+# --record copies the real files from upstream; otherwise a deterministic synthetic dataset with the same schema is
+# generated, so the benchmarks run offline.
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+PRISON_POP_HEADER = ['name', 'abbreviation', 'march_pop', 'april_pop', 'june_pop', 'july_pop', 'aug_pop', 'sept_pop', 'oct_pop', 'nov_pop', 'dec_pop',
+                     'as_of_date_march', 'as_of_date_april', 'as_of_date_june', 'as_of_date_july', 'as_of_date_aug', 'as_of_date_sept',
+                     'as_of_date_oct', 'as_of_date_nov', 'as_of_date_dec']
+PRISON_CASES_HEADER = ['name', 'abbreviation', 'staff_tests', 'staff_tests_with_multiples', 'total_staff_cases', 'staff_recovered',
+                       'total_staff_deaths', 'staff_partial_dose', 'staff_full_dose', 'prisoner_tests', 'prisoner_test_with_multiples',
+                       'total_prisoner_cases', 'prisoners_recovered', 'total_prisoner_deaths', 'prisoners_partial_dose', 'prisoners_full_dose',
+                       'as_of_date', 'notes']
+DAILY_REPORT_HEADER = ['Province_State', 'Country_Region', 'Last_Update', 'Lat', 'Long_', 'Confirmed', 'Deaths', 'Recovered', 'Active', 'FIPS',
+                       'Incident_Rate', 'People_Tested', 'People_Hospitalized', 'Mortality_Rate', 'UID', 'ISO3', 'Testing_Rate',
+                       'Hospitalization_Rate']
+# Rows in the JHU daily reports that are not one of the 50 states, with their FIPS codes
+JHU_EXTRA = [('American Samoa', 60), ('Diamond Princess', 88888), ('District of Columbia', 11), ('Grand Princess', 99999), ('Guam', 66),
+             ('Northern Mariana Islands', 69), ('Puerto Rico', 72), ('Virgin Islands', 78)]
+TIME_SERIES_HEADER = ['UID', 'iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 'Province_State', 'Country_Region', 'Lat', 'Long_', 'Combined_Key']
+TIME_SERIES_START = date(2020, 1, 22)
+START = date(2020, 4, 1)
+
+
+def record(directory):
+    for url in (pipeline.PRISON_POP_DATA_URL, pipeline.COVID_PRISON_DATA_URL):
+        with urllib.request.urlopen(url) as response, open(os.path.join(directory, os.path.basename(url)), 'wb') as f:
+            shutil.copyfileobj(response, f)
+    with open(os.path.join(directory, 'covid_prison_cases.csv')) as f:
+        rows = list(csv.DictReader(f))
+    data_date = max(date(int(y), int(m), int(d)) for m, d, y in (row['as_of_date'].split('/') for row in rows if row['as_of_date']))
+    urls = [pipeline.covid_data_url(data_date.strftime('%m-%d-%Y')), pipeline.time_series_url('confirmed'), pipeline.time_series_url('deaths')]
+    for url in urls:
+        with urllib.request.urlopen(url) as response, open(os.path.join(directory, os.path.basename(url)), 'wb') as f:
+            shutil.copyfileobj(response, f)
+
+
+# time_series_covid19_{confirmed,deaths}_US.csv: `counties` counties per state plus an 'Unassigned' row, and the
+# territories and cruise ships, with one cumulative column per day from TIME_SERIES_START through `last`
+def synthesize_time_series(directory, counties, last):
+    rnd = random.Random(1)
+    days = [TIME_SERIES_START + timedelta(days = n) for n in range((last - TIME_SERIES_START).days + 1)]
+    day_columns = [str(day.month) + '/' + str(day.day) + '/' + day.strftime('%y') for day in days]
+    rows = []
+    for name, fips in sorted(dict(zip(states.STATES['name'][:-1], states.STATES['fips'][:-1]), **dict(JHU_EXTRA)).items()):
+        for county in range(counties + 1):
+            admin2 = 'County ' + str(county + 1) if county < counties else 'Unassigned'
+            population = rnd.randint(1000, 1000000) if county < counties else 0
+            rows.append((8400000 + fips * 1000 + county, fips * 1000 + county, admin2, name, population, rnd.randint(30, 90), rnd.uniform(0.05, 0.3)))
+    for measure in ('confirmed', 'deaths'):
+        with open(os.path.join(directory, 'time_series_covid19_' + measure + '_US.csv'), 'w', newline = '') as f:
+            writer = csv.writer(f)
+            writer.writerow(TIME_SERIES_HEADER + (['Population'] if measure == 'deaths' else []) + day_columns)
+            for uid, fips, admin2, name, population, onset, attack in rows:
+                # Cumulative cases ramp up linearly after a per-county onset day; deaths are 1.5% of cases
+                confirmed = [max(0, int((population or 5000) * attack * (n - onset) / len(days))) for n in range(len(days))]
+                counts = confirmed if measure == 'confirmed' else [cases * 3 // 200 for cases in confirmed]
+                writer.writerow([uid, 'US', 'USA', 840, float(fips), admin2, name, 'US', 40.0, -90.0, admin2 + ', ' + name + ', US']
+                                + ([population] if measure == 'deaths' else []) + counts)
+
+
+def synthesize(directory, weeks, daily, counties):
+    rnd = random.Random(0)
+    names = list(states.STATES['name'][:-1])
+    codes = list(states.STATES['code'][:-1])
+    prison_pops = [rnd.randint(2000, 120000) for _ in names]
+
+    with open(os.path.join(directory, 'prison_populations.csv'), 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(PRISON_POP_HEADER)
+        for name, code, pop in zip(names, codes, prison_pops):
+            writer.writerow([name, code] + [pop] * 9 + ['2020-12-01'] * 9)
+        writer.writerow(['Federal', ''] + [150000] * 9 + ['2020-12-01'] * 9)
+
+    # One block of 50 states plus the federal system per reporting week, as upstream appends them
+    growth = [rnd.uniform(0.1, 0.5) for _ in names] + [0.3]
+    with open(os.path.join(directory, 'covid_prison_cases.csv'), 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(PRISON_CASES_HEADER)
+        for week in range(weeks):
+            as_of_date = (START + timedelta(weeks = week)).strftime('%m/%d/%Y')
+            for name, code, pop, rate in zip(names + ['Federal'], codes + [''], prison_pops + [150000], growth):
+                cases = int(pop * rate * (week + 1) / weeks)
+                writer.writerow([name, code, '', '', '', '', '', '', '', '', '', cases, '', cases // 100, '', '', as_of_date, ''])
+
+    # JHU rows: states and the extra territories / cruise ships in alphabetical order, then 'Recovered'
+    fips = dict(zip(states.STATES['name'][:-1], states.STATES['fips'][:-1]))
+    fips.update(JHU_EXTRA)
+    state_pops = {name: rnd.randint(500000, 30000000) for name in fips}
+    last = START + timedelta(weeks = weeks - 1)
+    days = [START + timedelta(days = n) for n in range((last - START).days + 1)] if daily else [last]
+    for day in days:
+        elapsed = (day - START).days + 1
+        with open(os.path.join(directory, day.strftime('%m-%d-%Y') + '.csv'), 'w', newline = '') as f:
+            writer = csv.writer(f)
+            writer.writerow(DAILY_REPORT_HEADER)
+            for name in sorted(fips):
+                pop = state_pops[name]
+                confirmed = max(1, int(pop * 0.0003 * elapsed))
+                deaths = confirmed // 60
+                writer.writerow([name, 'US', day.isoformat() + ' 04:30:00', 40.0, -90.0, confirmed, deaths, '', confirmed - deaths, fips[name],
+                                 confirmed * 100000 / pop, '', '', deaths * 100 / confirmed, 84000000 + fips[name], 'USA', '', ''])
+            writer.writerow(['Recovered', 'US', day.isoformat() + ' 04:30:00', '', '', 0, 0, '', '', '', '', '', '', '', 84070001, 'USA', '', ''])
+
+    synthesize_time_series(directory, counties, last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Write the benchmark fixtures')
+    parser.add_argument('--record', action = 'store_true', help = 'copy the current upstream files instead of synthesizing them')
+    parser.add_argument('--weeks', type = int, default = 40, help = 'weekly prison-case reports to synthesize')
+    parser.add_argument('--daily', action = 'store_true', help = 'synthesize a JHU daily report for every day, not just the latest')
+    parser.add_argument('--counties', type = int, default = 2, help = 'counties per state in the synthetic time series (upstream has ~65)')
+    parser.add_argument('--directory', default = FIXTURE_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok = True)
+    if args.record:
+        record(args.directory)
+    else:
+        synthesize(args.directory, args.weeks, args.daily, args.counties)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import gzip
+import os
+import sys
+
+import plotly.io as pio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import charts
+import history
+import pipeline
+import prison_data
+import snapshots
+
+# Bytes per st.plotly_chart call, with and without payload compaction (charts.COMPACT)
+# Streamlit sends each figure as pio.to_json(figure, validate = False); this builds every chart the page can show from
+# the offline fixtures and prints that payload's size, raw and gzipped, in both modes.
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load():
+    prison_history = history.ingest('covid_prison_cases', pipeline.COVID_PRISON_DATA_URL)
+    data_date = history.latest_date(prison_history).strftime('%m-%d-%Y')
+    prison_pop_data = prison_data.load_prison_pop_data()
+    combined_data = prison_data.combine(prison_data.load_covid_prison_data(prison_pop_data), prison_data.load_covid_data(data_date))
+    return combined_data, charts.grid_values(combined_data), charts.timeline_values(prison_data.load_timeline(prison_pop_data))
+
+
+def charts_for(metric, combined_data, grid_values, timeline_values):
+    color = charts.color(metric)
+    for renderer, make_grid in charts.GRID_RENDERERS.items():
+        yield 'grid ' + renderer, make_grid(grid_values, metric, color)
+    yield 'bar chart', charts.make_bar_chart(combined_data, metric, color)
+    for renderer in charts.GRID_FRAMES:
+        yield 'timeline grid ' + renderer, charts.make_timeline_grid(timeline_values, metric, color, renderer)
+    yield 'timeline bar chart', charts.make_timeline_bar_chart(timeline_values, metric, color)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Measure figure payload sizes with and without compaction')
+    parser.add_argument('--metric', default = 'CR', choices = charts.METRICS)
+    args = parser.parse_args()
+
+    snapshots.OFFLINE = True
+    snapshots.SNAPSHOT_DIR = FIXTURE_DIR
+    data = load()
+    sizes = {}
+    for compact in (False, True):
+        charts.COMPACT = compact
+        for label, figure in charts_for(args.metric, *data):
+            payload = pio.to_json(figure, validate = False).encode()
+            sizes.setdefault(label, []).append((len(payload), len(gzip.compress(payload))))
+
+    print('chart                     full KB  (gzip)  compact KB  (gzip)  saved')
+    for label, ((full, full_gzip), (compact, compact_gzip)) in sizes.items():
+        print(format(label, '24') + format(full / 1024, '9.1f') + format(full_gzip / 1024, '8.1f') + format(compact / 1024, '12.1f')
+              + format(compact_gzip / 1024, '8.1f') + format(1 - compact / full, '7.0%'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import make_fixtures
+import states
+import time_series
+
+# Peak memory and time of the streaming time-series rollup (time_series.load_measure) against a plain read_csv of the
+# whole wide file followed by a groupby, on a full-size synthetic file: ~65 counties per state and every day through
+# 3/9/23, like upstream. Peak memory is what tracemalloc sees allocated by Python, numpy and pandas.
+LAST_DAY = date(2023, 3, 9)
+
+
+def naive(path):
+    wide = pd.read_csv(path)
+    days = time_series._day_columns(list(wide.columns))
+    return wide[wide['Province_State'].isin(states.STATES['name'])].groupby('Province_State')[days].sum()
+
+
+# Wall-clock seconds of a plain run, and peak bytes of a second run under tracemalloc, which slows allocation down
+def measure(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare the streaming time-series loader with a whole-file read_csv')
+    parser.add_argument('--counties', type = int, default = 65, help = 'counties per state')
+    parser.add_argument('--chunksize', type = int, default = time_series.CHUNKSIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_fixtures.synthesize_time_series(directory, args.counties, LAST_DAY)
+        for measure_name in ('confirmed', 'deaths'):
+            path = os.path.join(directory, 'time_series_covid19_' + measure_name + '_US.csv')
+            print(os.path.basename(path) + ': ' + format(os.path.getsize(path) / 2 ** 20, '.1f') + ' MB')
+            print('loader                  seconds   peak MB')
+            for label, function, extra in (('read_csv + groupby', naive, ()), ('streaming', time_series.load_measure, (args.chunksize,))):
+                seconds, peak = measure(function, path, *extra)
+                print(format(label, '22') + format(seconds, '9.2f') + format(peak / 2 ** 20, '10.1f'))
+
+
+if __name__ == '__main__':
+    main()
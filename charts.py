@@ -0,0 +1,408 @@
+import copy
+import os
+
+from plotly.subplots import make_subplots
+import plotly.graph_objects as go
+import plotly.io as pio
+import numpy as np
+import pandas as pd
+
+import metrics
+import states
+
+METRICS = ['CR', 'MR', 'CFR']
+# New cases (CR<days>) and deaths (MR<days>) per 100,000 over each rolling window; see metrics.window_metrics
+WINDOW_METRICS = [metric + str(window) for window in metrics.WINDOWS for metric in ('CR', 'MR')]
+ALL_METRICS = METRICS + WINDOW_METRICS
+# Bar color of the prison series; a window metric takes the color of its cumulative metric
+COLORS = {'CR': '#F13B3B', 'MR': '#1E88E5', 'CFR': '#FFC107'}
+
+
+def color(metric):
+    return COLORS[metric.rstrip('0123456789')]
+
+# Payload compaction (COVID_PRISONS_COMPACT_FIGURES, on by default)
+# Rates are rounded to DISPLAY_DECIMALS and sent as float32 arrays, which plotly >= 6 serializes as base64 typed
+# arrays (older versions send them as plain lists). Styles repeated on every grid trace, axis and tile label move into
+# the figure's layout template, and the default Plotly template is cut down to the parts 2D bar and scatter charts use.
+COMPACT = os.environ.get('COVID_PRISONS_COMPACT_FIGURES', '1') not in ('', '0')
+DISPLAY_DECIMALS = 1
+TEMPLATE_LAYOUT_KEYS = ['annotationdefaults', 'autotypenumbers', 'font', 'hoverlabel', 'hovermode', 'paper_bgcolor', 'plot_bgcolor', 'title',
+                        'xaxis', 'yaxis']
+TEMPLATE_DATA_KEYS = ['bar', 'scatter']
+
+
+# Values as sent to the browser: rounded to display precision and float32 when compacting, unchanged otherwise
+def payload(values, decimals = DISPLAY_DECIMALS):
+    if not COMPACT:
+        return values
+    return np.round(np.asarray(values, dtype = np.float64), decimals).astype(np.float32)
+
+
+# The default Plotly template, keeping only what applies to 2D bar and scatter charts
+def compact_template():
+    template = pio.templates[pio.templates.default].to_plotly_json()
+    return {'layout': {key: copy.deepcopy(value) for key, value in template['layout'].items() if key in TEMPLATE_LAYOUT_KEYS},
+            'data': {key: copy.deepcopy(value) for key, value in template.get('data', {}).items() if key in TEMPLATE_DATA_KEYS}}
+
+
+# Tile-map layout: grid row and column (1-based, 9 x 12) of each state's tile
+TILES = pd.DataFrame([
+    ('ME', 1, 12), ('WA', 2, 1), ('MT', 2, 2), ('ND', 2, 3), ('MN', 2, 4), ('WI', 2, 5), ('MI', 2, 6), ('NY', 2, 9),
+    ('VT', 2, 10), ('NH', 2, 11), ('MA', 2, 12), ('OR', 3, 1), ('ID', 3, 2), ('WY', 3, 3), ('SD', 3, 4), ('IA', 3, 5),
+    ('IL', 3, 6), ('IN', 3, 7), ('OH', 3, 8), ('PA', 3, 9), ('NJ', 3, 10), ('CT', 3, 11), ('RI', 3, 12), ('NV', 4, 1),
+    ('UT', 4, 2), ('CO', 4, 3), ('NE', 4, 4), ('KS', 4, 5), ('MO', 4, 6), ('TN', 4, 7), ('KY', 4, 8), ('WV', 4, 9),
+    ('VA', 4, 10), ('MD', 4, 11), ('DE', 4, 12), ('CA', 5, 2), ('AZ', 5, 3), ('NM', 5, 4), ('OK', 5, 5), ('AR', 5, 6),
+    ('MS', 5, 7), ('AL', 5, 8), ('GA', 5, 9), ('SC', 5, 10), ('NC', 5, 11), ('TX', 6, 5), ('LA', 6, 6), ('FL', 6, 9),
+    ('AK', 8, 2), ('HI', 8, 4), ('NAT', 8, 11),
+], columns = ['code', 'row', 'col'])
+
+
+# Larger of the prison and state maxima of metric, ignoring NaN (NaN only if both series are all NaN)
+def _maximum(values, metric):
+    return float(np.fmax.reduce(np.concatenate([values['Prison_' + metric].ravel(), values['State_' + metric].ravel()])))
+
+
+# Per-state values for the grid, built once per dataset version so make_grid reads array slots instead of
+# filtering combined_data for every trace
+# position maps state code -> row; 'Prison_<metric>' / 'State_<metric>' are contiguous float64 arrays in that row
+# order; 'max_<metric>' is the larger of the two series' maxima, used for the shared y-axis range
+def grid_values(combined_data):
+    combined_data = combined_data.reindex(states.INDEX)
+    values = {'position': {code: i for i, code in enumerate(states.INDEX)}}
+    for metric in ALL_METRICS:
+        for series in ('Prison_', 'State_'):
+            values[series + metric] = np.ascontiguousarray(pd.to_numeric(combined_data[series + metric], errors = 'coerce'), dtype = np.float64)
+        values['max_' + metric] = _maximum(values, metric)
+    return values
+
+
+# Grid values for every date of a timeline (prison_data.load_timeline), for the animated charts
+# Same keys as grid_values, but each series is a (dates x states) array, 'max_<metric>' is the maximum over all dates
+# so the scale stays fixed while scrubbing, and 'dates' holds the slider labels
+def timeline_values(timeline):
+    dates = timeline.index.get_level_values('as_of_date').unique().sort_values()
+    timeline = timeline.reindex(pd.MultiIndex.from_product([dates, states.INDEX]))
+    values = {'position': {code: i for i, code in enumerate(states.INDEX)}, 'dates': [as_of_date.strftime('%m/%d/%Y') for as_of_date in dates]}
+    for metric in ALL_METRICS:
+        for series in ('Prison_', 'State_'):
+            column = pd.to_numeric(timeline[series + metric], errors = 'coerce').to_numpy(dtype = np.float64)
+            values[series + metric] = column.reshape(len(dates), len(states.INDEX))
+        values['max_' + metric] = _maximum(values, metric)
+    return values
+
+
+# One date of timeline_values, in the shape grid_values returns (the maximum stays the one over all dates)
+def values_at(timeline, i):
+    values = {key: value for key, value in timeline.items() if key != 'dates'}
+    for metric in ALL_METRICS:
+        for series in ('Prison_', 'State_'):
+            values[series + metric] = timeline[series + metric][i]
+    return values
+
+
+# Layout of the 9 x 12 subplot grid, built once with make_subplots and reused as a plain dict
+# Tile labels are subplot titles one row below each tile, so they sit under the bars. Returns the layout dict and
+# the (xaxis, yaxis) reference of every tile, in TILES order.
+# Based off grid from http://awesome-streamlit.org --> Gallery --> 'Layout and Style Experiments'
+_subplot_layout = None
+def subplot_layout():
+    global _subplot_layout
+    if _subplot_layout is None:
+        titles = [''] * (9 * 12)
+        for code, row, col in TILES.itertuples(index = False):
+            titles[row * 12 + col - 1] = code
+        grid = make_subplots(rows = 9, cols = 12, subplot_titles = titles)
+        grid.update_layout(
+            #width = 1100,
+            #height = 1038,
+            width = 1000,
+            height = 944,
+            #showlegend = False,
+            #legend_itemclick = False,
+            #legend_itemdoubleclick = False,
+            legend = dict (
+                font = dict (
+                    size = 14,
+                ),
+            ),
+            plot_bgcolor = '#ffffff',
+            font = dict(family = 'IBM Plex Sans', size = 12, color = '#000000'),
+        )
+        grid.update_xaxes(showticklabels = False, linecolor = '#000000')
+        grid.update_yaxes(visible = False)
+        axes = []
+        for row, col in zip(TILES['row'], TILES['col']):
+            subplot = grid.get_subplot(row, col)
+            axes.append((subplot.xaxis.plotly_name.replace('axis', ''), subplot.yaxis.plotly_name.replace('axis', '')))
+        _subplot_layout = (grid.layout.to_plotly_json(), axes)
+    return _subplot_layout
+
+
+# The subplot layout with everything repeated moved into its template: tile labels keep only text and position,
+# axes only anchor, domain (to 4 decimals) and, for y, the range set per figure. The 57 axis pairs with no tile are left
+# out; they draw nothing.
+_compact_subplot_layout = None
+def compact_subplot_layout():
+    global _compact_subplot_layout
+    if _compact_subplot_layout is None:
+        full, axes = subplot_layout()
+        layout = {key: copy.deepcopy(value) for key, value in full.items()
+                  if key not in ('template', 'annotations') and not key.startswith(('xaxis', 'yaxis'))}
+        template = compact_template()
+        first = full['annotations'][0]
+        template['layout']['annotationdefaults'] = {key: first[key] for key in ('font', 'showarrow', 'xanchor', 'yanchor', 'xref', 'yref')}
+        # Streamlit sets its own default template, which has no axis entries
+        template['layout'].setdefault('xaxis', {}).update(showticklabels = False, linecolor = '#000000')
+        template['layout'].setdefault('yaxis', {}).update(visible = False)
+        layout['template'] = template
+        layout['annotations'] = [{'text': note['text'], 'x': round(note['x'], 4), 'y': round(note['y'], 4)} for note in full['annotations']]
+        for xaxis, yaxis in axes:
+            x = xaxis.replace('x', 'xaxis')
+            y = yaxis.replace('y', 'yaxis')
+            layout[x] = {'anchor': full[x]['anchor'], 'domain': [round(bound, 4) for bound in full[x]['domain']]}
+            layout[y] = {'anchor': full[y]['anchor'], 'domain': [round(bound, 4) for bound in full[y]['domain']]}
+        _compact_subplot_layout = (layout, axes)
+    return _compact_subplot_layout
+
+
+# Template entries for the grid's bar traces; a template's trace entries apply to the figure's bar traces in turn, so
+# the two alternate between the prison and statewide bars of each tile
+def grid_bar_templates(color):
+    return [{'width': 0.3, 'marker': {'color': bar_color}, 'legendgroup': group, 'name': name, 'showlegend': False,
+             'hovertemplate': '%{y:,.' + str(DISPLAY_DECIMALS) + 'f}'}
+            for name, bar_color, group in (('In prisons', color, '1'), ('Statewide', '#000000', '2'))]
+
+
+# Trace dicts for the subplot grid, from the tile spec: one bar per (tile, series)
+# The first tile's traces carry the legend entries, as add_trace did for Maine. Compact traces carry only their value
+# and axes, plus x = 0 / 1 for the two bars, which is where the category axis put them.
+def grid_traces(values, metric, color, axes):
+    at = values['position']
+    traces = []
+    for i, code in enumerate(TILES['code']):
+        for x, (series, name, bar_color, group) in enumerate((('Prison_', 'In prisons', color, '1'), ('State_', 'Statewide', '#000000', '2'))):
+            if COMPACT:
+                trace = {'type': 'bar', 'x': [x], 'y': [round(float(values[series + metric][at[code]]), DISPLAY_DECIMALS)], 'xaxis': axes[i][0],
+                         'yaxis': axes[i][1]}
+                if i == 0:
+                    trace['showlegend'] = True
+                traces.append(trace)
+                continue
+            trace = {'type': 'bar', 'x': [name], 'y': [values[series + metric][at[code]]], 'width': 0.3,
+                     'marker': {'color': bar_color}, 'legendgroup': group, 'xaxis': axes[i][0], 'yaxis': axes[i][1]}
+            if i == 0:
+                trace['name'] = name
+            else:
+                trace['showlegend'] = False
+            traces.append(trace)
+    return traces
+
+
+# Create grid map with Plotly subplots
+# The figure is assembled as one dict from the cached layout and the tile spec, and wrapped without re-running
+# Plotly's property validation on the 108 axes and 102 traces (the inputs above are already well-formed)
+def make_grid(values, metric, color):
+    layout, axes = compact_subplot_layout() if COMPACT else subplot_layout()
+    top = values['max_' + metric]
+    layout = copy.deepcopy(layout)
+    y_range = [0.01 * top, top + 0.05 * top]
+    if COMPACT:
+        y_range = [round(bound, 2) for bound in y_range]
+    for key in layout:
+        if key.startswith('yaxis'):
+            layout[key]['range'] = y_range
+    if COMPACT:
+        layout['template']['data']['bar'] = grid_bar_templates(color)
+    return go.Figure({'data': grid_traces(values, metric, color, axes), 'layout': layout}, _validate = False)
+
+
+# Bar height per unit of metric on the tile map, so the tallest bar fills 0.75 / 1.05 of a tile; 0 when the maximum is
+# 0 or NaN (every value is), which leaves the bars flat
+def _tile_scale(top):
+    return 0.75 / (1.05 * top) if top > 0 else 0.0
+
+
+# Lean tile map: the same layout drawn on one pair of shared axes
+# Each series is a single bar trace positioned by the TILES table (x = tile column, base = tile baseline), with one
+# text trace for the labels and one line trace for the baselines, so the figure has 4 traces and 1 axis pair instead of
+# 102 traces and 108 subplots
+def make_tile_grid(values, metric, color):
+    at = values['position']
+    rows = TILES['row'].to_numpy()
+    cols = TILES['col'].to_numpy()
+    position = [at[code] for code in TILES['code']]
+    names = states.STATES['name'].to_numpy()[position]
+    baseline = 9 - rows + 0.05
+    scale = _tile_scale(values['max_' + metric])
+
+    grid = go.Figure()
+    for series, name, offset, bar_color in (('Prison_', 'In prisons', -0.17, color), ('State_', 'Statewide', 0.17, '#000000')):
+        y = values[series + metric][position]
+        grid.add_trace(go.Bar(
+            x = payload(cols + offset, 2),
+            y = payload(y * scale, 4),
+            base = baseline,
+            width = 0.3,
+            customdata = payload(y),
+            text = names,
+            textposition = 'none',
+            hovertemplate = '%{text}: %{customdata:,.1f}',
+            marker_color = bar_color,
+            name = name,
+            ))
+    grid.add_trace(go.Scatter(
+        x = payload(np.column_stack([cols - 0.35, cols + 0.35, np.full(len(cols), np.nan)]).ravel(), 2),
+        y = payload(np.column_stack([baseline, baseline, np.full(len(cols), np.nan)]).ravel(), 2),
+        mode = 'lines',
+        line = dict(color = '#000000', width = 1),
+        hoverinfo = 'skip',
+        showlegend = False,
+        ))
+    grid.add_trace(go.Scatter(
+        x = cols,
+        y = payload(baseline - 0.15, 2),
+        text = TILES['code'],
+        mode = 'text',
+        textfont = dict(size = 16),
+        hoverinfo = 'skip',
+        showlegend = False,
+        ))
+
+    grid.update_layout(
+        width = 1000,
+        height = 944,
+        barmode = 'overlay',
+        legend = dict (
+            font = dict (
+                size = 14,
+            ),
+        ),
+        plot_bgcolor = '#ffffff',
+        font = dict(family = 'IBM Plex Sans', size = 12, color = '#000000'),
+        margin = dict(l = 20, r = 20, t = 40, b = 20),
+    )
+    if COMPACT:
+        grid.layout.template = compact_template()
+    grid.update_xaxes(range = [0.5, 12.5], visible = False, fixedrange = True)
+    grid.update_yaxes(range = [0.7, 8.9], visible = False, fixedrange = True)
+    return grid
+
+
+GRID_RENDERERS = {
+    'subplots': make_grid,
+    'tiles': make_tile_grid,
+}
+
+
+# Frame data for each grid renderer: the per-trace values that change from one date to the next, in trace order
+def subplot_frame(values, metric):
+    position = [values['position'][code] for code in TILES['code']]
+    y = np.column_stack([values['Prison_' + metric][position], values['State_' + metric][position]]).ravel()
+    if COMPACT:
+        y = np.round(y, DISPLAY_DECIMALS)
+    return [{'type': 'bar', 'y': [value]} for value in y.tolist()]
+
+
+def tile_frame(values, metric):
+    position = [values['position'][code] for code in TILES['code']]
+    scale = _tile_scale(values['max_' + metric])
+    return [{'type': 'bar', 'y': payload(values[series + metric][position] * scale, 4), 'customdata': payload(values[series + metric][position])}
+            for series in ('Prison_', 'State_')]
+
+
+GRID_FRAMES = {
+    'subplots': subplot_frame,
+    'tiles': tile_frame,
+}
+
+
+# Attach one animation frame per date, plus a date slider and a play button, to a figure drawn at the last date
+# Frames only carry the changing values; the axes were already fixed to the maximum over all dates, so scrubbing is a
+# client-side restyle with a constant scale and no server round trip
+def animate(figure, labels, frames):
+    figure = figure.to_plotly_json()
+    step_args = {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': True}, 'transition': {'duration': 0}}
+    figure['frames'] = [{'name': label, 'data': data} for label, data in zip(labels, frames)]
+    figure['layout']['sliders'] = [{
+        'active': len(labels) - 1,
+        'currentvalue': {'prefix': 'As of '},
+        'pad': {'t': 30},
+        'steps': [{'label': label, 'method': 'animate', 'args': [[label], step_args]} for label in labels],
+    }]
+    figure['layout']['updatemenus'] = [{
+        'type': 'buttons',
+        'showactive': False,
+        'x': 0,
+        'y': 0,
+        'xanchor': 'right',
+        'yanchor': 'top',
+        'pad': {'t': 30, 'r': 10},
+        'buttons': [{'label': 'Play', 'method': 'animate',
+                     'args': [None, dict(step_args, frame = {'duration': 300, 'redraw': True}, fromcurrent = True)]}],
+    }]
+    return go.Figure(figure, _validate = False)
+
+
+# Grid map with a date slider over every date of the timeline
+def make_timeline_grid(timeline, metric, color, renderer = 'subplots'):
+    dates = timeline['dates']
+    grid = GRID_RENDERERS[renderer](values_at(timeline, len(dates) - 1), metric, color)
+    return animate(grid, dates, [GRID_FRAMES[renderer](values_at(timeline, i), metric) for i in range(len(dates))])
+
+
+BAR_CHART_TITLES = {
+    'CR': 'COVID-19 Case Rate (confirmed cases per 100,000 persons)',
+    'MR': 'COVID-19 Mortality Rate (confirmed deaths per 100,000 persons)',
+    'CFR': 'COVID-19 Case-Fatality Ratio (confirmed deaths per 100,000 confirmed cases)',
+}
+for window in metrics.WINDOWS:
+    BAR_CHART_TITLES['CR' + str(window)] = 'New COVID-19 cases per 100,000 persons, last ' + str(window) + ' days'
+    BAR_CHART_TITLES['MR' + str(window)] = 'New COVID-19 deaths per 100,000 persons, last ' + str(window) + ' days'
+
+
+# Horizontal bar chart of every state, in prisons vs. statewide
+def make_bar_chart(combined_data, metric, color):
+    chart = go.Figure()
+    chart.add_trace(go.Bar(
+        x = payload(combined_data['Prison_' + metric]),
+        y = combined_data['name'],
+        orientation = 'h',
+        name = 'In prisons',
+        marker_color = color,
+        ))
+    chart.add_trace(go.Bar(
+        x = payload(combined_data['State_' + metric]),
+        y = combined_data['name'],
+        orientation = 'h',
+        name = 'Statewide',
+        marker_color = '#000000',
+        ))
+    chart.update_layout(
+        xaxis_title = BAR_CHART_TITLES[metric],
+        yaxis_title = 'State',
+        width = 1000,
+        height = 1100,
+        barmode = 'group',
+        bargap = 0.4,
+        plot_bgcolor = '#ffffff',
+        font = dict(family = 'IBM Plex Sans', size = 14, color = '#000000'),
+        )
+    chart.update_yaxes(autorange = 'reversed')
+    if COMPACT:
+        chart.layout.template = compact_template()
+    return chart
+
+
+# Bar chart with a date slider over every date of the timeline, on an x-axis fixed to the maximum over all dates
+def make_timeline_bar_chart(timeline, metric, color):
+    dates = timeline['dates']
+    last = len(dates) - 1
+    combined_data = pd.DataFrame({'name': states.STATES['name'].to_numpy(),
+                                  'Prison_' + metric: timeline['Prison_' + metric][last],
+                                  'State_' + metric: timeline['State_' + metric][last]})
+    chart = make_bar_chart(combined_data, metric, color)
+    chart.update_xaxes(range = [0, 1.05 * timeline['max_' + metric]])
+    frames = [[{'type': 'bar', 'x': payload(timeline['Prison_' + metric][i])}, {'type': 'bar', 'x': payload(timeline['State_' + metric][i])}]
+              for i in range(len(dates))]
+    return animate(chart, dates, frames)
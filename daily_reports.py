@@ -0,0 +1,179 @@
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import schemas
+import snapshots
+import states
+
+# JHU US daily reports as one dense state x date x measure cube
+# `python daily_reports.py` backfills the cube from a directory of daily report files (<MM-DD-YYYY>.csv, or the
+# .parquet snapshots) or from a list of URLs / a date range of upstream reports, parsing the files in parallel in a
+# process pool. The cube is a float64 .npy array of shape (days, states.STATE_CODES, MEASURES) on a contiguous daily
+# grid starting at its first date, with NaN for days without a report, plus <CUBE_NAME>.json with the start date and
+# when each report it holds was parsed. It is memory-mapped on load, so a date lookup or a state's time series is an
+# array slice rather than a file read.
+CUBE_NAME = 'jhu_daily_cube'
+MEASURES = ['Confirmed', 'Deaths', 'Incident_Rate', 'Mortality_Rate']
+DATE_FORMAT = '%m-%d-%Y'
+_REPORT = re.compile(r'(\d\d-\d\d-\d{4})\.(csv|parquet)$')
+
+
+def _path():
+    return os.path.join(snapshots.SNAPSHOT_DIR, CUBE_NAME + '.npy')
+
+
+def report_date(source):
+    match = _REPORT.search(source)
+    return match.group(1) if match else None
+
+
+# Parse one daily report (a path or URL) into a (states, MEASURES) float64 array; returns (data_date, values), with
+# values None if the report could not be read. Runs in the worker processes.
+def parse_report(source):
+    try:
+        data = snapshots.read(source, schemas.DAILY_REPORT)
+    except (OSError, ValueError, pd.errors.ParserError):
+        return report_date(source), None
+    data = states.keyed(data, 'FIPS', by = 'fips').reindex(states.STATE_CODES)
+    values = np.empty((len(states.STATE_CODES), len(MEASURES)), dtype = np.float64)
+    for i, measure in enumerate(MEASURES):
+        values[:, i] = pd.to_numeric(data[measure], errors = 'coerce')
+    return report_date(source), values
+
+
+def sources_in(directory):
+    found = {}
+    for entry in sorted(os.listdir(directory)):
+        data_date = report_date(entry)
+        # Prefer the parquet snapshot over a CSV of the same date
+        if data_date is not None and (data_date not in found or entry.endswith('.parquet')):
+            found[data_date] = os.path.join(directory, entry)
+    return list(found.values())
+
+
+def sources_between(start, end):
+    start = datetime.strptime(start, DATE_FORMAT)
+    end = datetime.strptime(end, DATE_FORMAT)
+    return [pipeline.covid_data_url((start + timedelta(days = n)).strftime(DATE_FORMAT)) for n in range((end - start).days + 1)]
+
+
+def metadata():
+    return snapshots.metadata(CUBE_NAME)
+
+
+# The cube as {'start': first date, 'dates': DatetimeIndex, 'values': (days, states, MEASURES) array}, or None if
+# no backfill has run; values is memory-mapped read-only unless mmap is False
+def load(mmap = True):
+    meta = metadata()
+    if meta is None or not os.path.exists(_path()):
+        return None
+    values = np.load(_path(), mmap_mode = 'r' if mmap else None)
+    start = pd.Timestamp(meta['start'])
+    return {'start': start, 'dates': pd.date_range(start, periods = values.shape[0], freq = 'D'), 'values': values}
+
+
+def _index(cube, data_date):
+    i = (pd.Timestamp(data_date) - cube['start']).days
+    return i if 0 <= i < cube['values'].shape[0] else None
+
+
+# (states, MEASURES) values for one date, all NaN if the cube has no report for it
+def at(cube, data_date):
+    i = _index(cube, data_date)
+    if i is None:
+        return np.full(cube['values'].shape[1:], np.nan)
+    return cube['values'][i]
+
+
+# (days, MEASURES) time series of one state
+def series(cube, code):
+    return cube['values'][:, states.STATE_CODES.get_loc(code)]
+
+
+def has(cube, data_date):
+    i = _index(cube, data_date)
+    return i is not None and not np.isnan(cube['values'][i]).all()
+
+
+# Parse every source in a process pool and merge the results into the stored cube
+# Reports already in the cube are skipped unless force is set; returns (parsed, skipped, failed) counts
+def backfill(sources, max_workers = None, force = False):
+    meta = metadata() or {'reports': {}}
+    cube = load(mmap = False)
+    requested = len(sources)
+    if not force:
+        sources = [source for source in sources if report_date(source) not in meta['reports']]
+    skipped = requested - len(sources)
+    parsed = {}
+    failed = 0
+    if sources:
+        with ProcessPoolExecutor(max_workers = max_workers) as pool:
+            for data_date, values in pool.map(parse_report, sources, chunksize = 8):
+                if values is None:
+                    failed += 1
+                else:
+                    parsed[data_date] = values
+    if not parsed:
+        return 0, skipped, failed
+
+    dates = [pd.Timestamp(datetime.strptime(data_date, DATE_FORMAT)) for data_date in parsed]
+    if cube is not None:
+        dates += [cube['dates'][0], cube['dates'][-1]]
+    start = min(dates)
+    values = np.full(((max(dates) - start).days + 1, len(states.STATE_CODES), len(MEASURES)), np.nan)
+    if cube is not None:
+        offset = (cube['start'] - start).days
+        values[offset:offset + cube['values'].shape[0]] = cube['values']
+    for data_date, report in parsed.items():
+        values[(pd.Timestamp(datetime.strptime(data_date, DATE_FORMAT)) - start).days] = report
+        meta['reports'][data_date] = time.time()
+
+    os.makedirs(snapshots.SNAPSHOT_DIR, exist_ok = True)
+    fd, tmp = tempfile.mkstemp(dir = snapshots.SNAPSHOT_DIR, suffix = '.npy.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp, _path())
+    meta['start'] = start.strftime('%Y-%m-%d')
+    snapshots.write_metadata(CUBE_NAME, meta)
+    return len(parsed), skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Backfill the JHU daily report cube')
+    parser.add_argument('--directory', help = 'directory of <MM-DD-YYYY>.csv or .parquet daily reports')
+    parser.add_argument('--url-list', help = 'file with one daily report URL per line')
+    parser.add_argument('--from', dest = 'start', help = 'first upstream report to fetch, MM-DD-YYYY')
+    parser.add_argument('--to', dest = 'end', help = 'last upstream report to fetch, MM-DD-YYYY')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: one per CPU)')
+    parser.add_argument('--force', action = 'store_true', help = 're-parse reports already in the cube')
+    args = parser.parse_args()
+
+    sources = []
+    if args.directory:
+        sources += sources_in(args.directory)
+    if args.url_list:
+        with open(args.url_list) as f:
+            sources += [line.strip() for line in f if line.strip()]
+    if args.start:
+        sources += sources_between(args.start, args.end or args.start)
+    if not sources:
+        parser.error('nothing to backfill; pass --directory, --url-list or --from/--to')
+
+    start = time.perf_counter()
+    parsed, skipped, failed = backfill(sources, args.workers, args.force)
+    print('parsed ' + str(parsed) + ', skipped ' + str(skipped) + ', failed ' + str(failed) + ' reports in '
+          + format(time.perf_counter() - start, '.2f') + 's; cube at ' + _path())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import charts
+import pipeline
+import prison_data
+import profiling
+import single_flight
+import snapshots
+
+# Process-wide dataset cache, shared by every page in the server (covid-prisons.py and the indiv-metrics pages)
+# pipeline.prefetch brings the sources into the snapshot store at most once per CHECK_INTERVAL seconds, however many
+# pages and sessions ask; the frames built from them are loaded once per dataset version and kept until the next
+# version replaces them. Callers must treat the returned frames as read-only, since every session gets the same objects.
+# Each step runs single-flight: sessions arriving while it is under way (e.g. several visitors on a cold cache) wait for
+# that one call and share its result or its failure, instead of fetching and parsing the sources again.
+CHECK_INTERVAL = snapshots.MAX_AGE
+# Set by refresher.start(): a background thread keeps the sources current and swaps in each new version whole, so
+# requests serve the version they find instead of checking the sources themselves
+BACKGROUND = False
+
+_lock = threading.Lock()
+_checked_at = None
+_source = None
+_current = None
+_timeline = None
+# Set once a version is published, or once a refresh fails while none is; requests wait on it after a cold start
+_published = threading.Event()
+_error = None
+
+
+# (data_date, dataset_version, fetch timings) of the sources in the snapshot store, refreshing them if it is time to
+def source():
+    profiling.cache_call('dataset.source')
+    with _lock:
+        if _source is not None and (BACKGROUND or time.time() - _checked_at < CHECK_INTERVAL):
+            return _source
+    if BACKGROUND:
+        # Nothing published yet: wait for the refresher's first version, and fail with it if it fails
+        profiling.cache_miss('dataset.source')
+        _published.wait()
+        with _lock:
+            if _source is None:
+                raise _error
+            return _source
+    return single_flight.run('dataset.source', _check)
+
+
+def _check():
+    global _checked_at, _source
+    # Checked again: a flight that finished since the caller looked may have refreshed the sources already
+    with _lock:
+        if _source is not None and time.time() - _checked_at < CHECK_INTERVAL:
+            return _source
+    profiling.cache_miss('dataset.source')
+    data_date, timings = pipeline.prefetch()
+    with _lock:
+        _source = (data_date, pipeline.dataset_version(data_date), timings)
+        _checked_at = time.time()
+        return _source
+
+
+# The frames behind the pages, as {'data_date', 'dataset_version', 'fetch_timings', 'prison_pop_data',
+# 'covid_prison_data', 'covid_data', 'combined_data', 'grid_values'}
+def load():
+    data_date, dataset_version, timings = source()
+    profiling.cache_call('dataset.load')
+    with _lock:
+        if _current is not None and _current['dataset_version'] == dataset_version:
+            return _current
+    return single_flight.run(('dataset.load', dataset_version), _build, data_date, dataset_version, timings)
+
+
+def _build(data_date, dataset_version, timings):
+    global _current
+    with _lock:
+        if _current is not None and _current['dataset_version'] == dataset_version:
+            return _current
+    profiling.cache_miss('dataset.load')
+    current = _frames(data_date, dataset_version, timings)
+    with _lock:
+        _current = current
+    return current
+
+
+def _frames(data_date, dataset_version, timings):
+    prison_pop_data = prison_data.load_prison_pop_data()
+    covid_prison_data = prison_data.load_covid_prison_data(prison_pop_data)
+    covid_data = prison_data.load_covid_data(data_date)
+    combined_data = prison_data.combine(covid_prison_data, covid_data)
+    return {
+        'data_date': data_date,
+        'dataset_version': dataset_version,
+        'fetch_timings': timings,
+        'prison_pop_data': prison_pop_data,
+        'covid_prison_data': covid_prison_data,
+        'covid_data': covid_data,
+        'combined_data': combined_data,
+        'grid_values': charts.grid_values(combined_data),
+    }
+
+
+# charts.timeline_values for every as_of_date in the prison history of data (a load() result), built once per version
+def timeline(data):
+    profiling.cache_call('dataset.timeline')
+    with _lock:
+        if _timeline is not None and _timeline[0] == data['dataset_version']:
+            return _timeline[1]
+    return single_flight.run(('dataset.timeline', data['dataset_version']), _build_timeline, data)
+
+
+def _build_timeline(data):
+    global _timeline
+    with _lock:
+        if _timeline is not None and _timeline[0] == data['dataset_version']:
+            return _timeline[1]
+    profiling.cache_miss('dataset.timeline')
+    values = charts.timeline_values(prison_data.load_timeline(data['prison_pop_data']))
+    with _lock:
+        _timeline = (data['dataset_version'], values)
+    return values
+
+
+# Fetch the sources and, if they make a new dataset version, build all of it off to the side (frames, timeline values,
+# then prepare(data) for anything else derived from it, e.g. figures) before swapping it in: the source, frames and
+# timeline change together under the lock, so a request sees either the old version or the whole new one. Requests
+# meanwhile keep the old version. On a cold start there is no old version to serve, so the frames are published as soon
+# as they are built and the rest follows, the timeline through timeline() as if a request had asked for it. Only the
+# refresher calls this; returns True if a new version was published.
+def refresh(prepare = None):
+    global _error
+    try:
+        return single_flight.run('dataset.refresh', _refresh, prepare)
+    except Exception as e:
+        with _lock:
+            if _source is None:
+                _error = e
+                _published.set()
+        raise
+
+
+def _publish(data_date, dataset_version, timings, current, timeline_entry):
+    global _checked_at, _source, _current, _timeline, _error
+    with _lock:
+        _source = (data_date, dataset_version, timings)
+        _checked_at = time.time()
+        _current = current
+        _timeline = timeline_entry
+        _error = None
+        _published.set()
+
+
+def _refresh(prepare):
+    global _checked_at, _source
+    data_date, timings = pipeline.prefetch()
+    dataset_version = pipeline.dataset_version(data_date)
+    with _lock:
+        if _current is not None and _current['dataset_version'] == dataset_version:
+            _source = (data_date, dataset_version, timings)
+            _checked_at = time.time()
+            return False
+        cold = _current is None
+
+    # The refresher's own lookup, so a version it builds counts as a miss like one a request builds
+    profiling.cache_call('dataset.load')
+    profiling.cache_miss('dataset.load')
+    current = _frames(data_date, dataset_version, timings)
+    if cold:
+        _publish(data_date, dataset_version, timings, current, None)
+        if prepare is not None:
+            prepare(current)
+        timeline(current)
+        return True
+
+    profiling.cache_call('dataset.timeline')
+    profiling.cache_miss('dataset.timeline')
+    values = charts.timeline_values(prison_data.load_timeline(current['prison_pop_data']))
+    if prepare is not None:
+        prepare(current)
+    _publish(data_date, dataset_version, timings, current, (dataset_version, values))
+    return True
+
+
+# True once a version has been published
+def published():
+    with _lock:
+        return _current is not None
+
+
+def clear():
+    global _checked_at, _source, _current, _timeline, _error
+    with _lock:
+        _checked_at = _source = _current = _timeline = _error = None
+        _published.clear()
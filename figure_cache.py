@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+# Process-wide figure cache, shared by every Streamlit session in the server
+# Figures are keyed by (chart, metric, dataset version), so a radio toggle after the first one is a dictionary hit and
+# a new dataset version simply misses. The in-memory store is an LRU of at most MAX_ENTRIES figures. When CACHE_DIR is
+# set, figures are also written there as Plotly JSON and read back after a restart. Each figure's size is taken as the
+# length of its Plotly JSON, for the memory ceiling in covid-prisons.py.
+MAX_ENTRIES = int(os.environ.get('COVID_PRISONS_FIGURE_CACHE_SIZE', 32))
+CACHE_DIR = os.environ.get('COVID_PRISONS_FIGURE_CACHE_DIR')
+
+_figures = OrderedDict()
+_sizes = {}
+_lock = threading.Lock()
+
+
+def _path(chart, metric, version):
+    return os.path.join(CACHE_DIR, chart + '-' + metric + '-' + version + '.json')
+
+
+def _load(chart, metric, version):
+    if CACHE_DIR is None:
+        return None
+    try:
+        with open(_path(chart, metric, version)) as f:
+            return pio.from_json(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _save(chart, metric, version, figure):
+    os.makedirs(CACHE_DIR, exist_ok = True)
+    prefix = chart + '-' + metric + '-'
+    for old in os.listdir(CACHE_DIR):
+        if old.startswith(prefix) and old.endswith('.json'):
+            os.remove(os.path.join(CACHE_DIR, old))
+    tmp = _path(chart, metric, version) + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(pio.to_json(figure))
+    os.replace(tmp, _path(chart, metric, version))
+
+
+def _put(key, figure):
+    size = len(pio.to_json(figure))
+    with _lock:
+        _figures[key] = figure
+        _figures.move_to_end(key)
+        _sizes[key] = size
+        while len(_figures) > MAX_ENTRIES:
+            old, _ = _figures.popitem(last = False)
+            del _sizes[old]
+
+
+# Return the cached figure for (chart, metric, version), calling build() to make it on a miss
+# Callers must treat the returned figure as read-only, since other sessions get the same object
+def get(chart, metric, version, build):
+    key = (chart, metric, version)
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            return _figures[key]
+
+    figure = _load(chart, metric, version)
+    if figure is None:
+        figure = build()
+        if CACHE_DIR is not None:
+            _save(chart, metric, version, figure)
+    _put(key, figure)
+    return figure
+
+
+# Total size of the cached figures in bytes
+def nbytes():
+    with _lock:
+        return sum(_sizes.values())
+
+
+def clear():
+    with _lock:
+        _figures.clear()
+        _sizes.clear()
@@ -0,0 +1,300 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+import schemas
+import single_flight
+import snapshots
+
+# Full history of covid_prison_cases.csv, indexed by (as_of_date, name)
+# Upstream only appends a block of rows each reporting week, so the history is ingested incrementally. The metadata
+# records the byte ranges already ingested ('segments', each with its sha256) and the checksum of the BOUNDARY_BYTES
+# before the end of the last one. A refresh requests just `Range: bytes=<end - BOUNDARY_BYTES>-`; if the boundary still
+# matches and the header line is unchanged (a short range request checked against its stored checksum), only the
+# complete lines past the end are parsed and appended to the stored history; a tail whose rows do not have one field
+# per header column, or that fails to parse, means the file has changed shape and is reparsed. Every FULL_CHECK_AGE seconds the
+# whole file is downloaded instead and every segment re-verified; the history is reparsed from scratch only when one
+# of those prefix checksums has changed (or when the boundary does not match, or the server ignores Range and the
+# prefix differs). Parsing streams CHUNKSIZE rows at a time and keeps only the columns of the source's schema, picked by
+# header name with the registered dtypes, so ingest memory is bounded by the chunk size.
+HISTORY_NAME = 'covid_prison_history'
+COLUMNS = list(schemas.COVID_PRISON_CASES)
+CHUNKSIZE = 5000
+BOUNDARY_BYTES = 16384
+FULL_CHECK_AGE = int(os.environ.get('COVID_PRISONS_HISTORY_FULL_CHECK_AGE', 86400))
+
+
+def _path():
+    return os.path.join(snapshots.SNAPSHOT_DIR, HISTORY_NAME + '.parquet')
+
+
+def _normalize(chunk):
+    chunk = chunk[COLUMNS].copy()
+    chunk['name'] = chunk['name'].astype(str)
+    chunk['abbreviation'] = chunk['abbreviation'].astype(object)
+    chunk['total_prisoner_cases'] = pd.to_numeric(chunk['total_prisoner_cases'], errors = 'coerce').astype('float64')
+    chunk['total_prisoner_deaths'] = pd.to_numeric(chunk['total_prisoner_deaths'], errors = 'coerce').astype('float64')
+    chunk['as_of_date'] = pd.to_datetime(chunk['as_of_date'], errors = 'coerce')
+    return chunk.dropna(subset = ['as_of_date'])
+
+
+# One row per (as_of_date, name), the latest report winning, on a sorted index
+def _indexed(rows):
+    rows = rows.drop_duplicates(subset = ['as_of_date', 'name'], keep = 'last')
+    return rows.set_index(['as_of_date', 'name']).sort_index()
+
+
+def _usable(meta, url):
+    return meta is not None and meta.get('url') == url and bool(meta.get('segments')) and os.path.exists(_path())
+
+
+def _sha256(path, start, end):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(1 << 16, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+# Offset just past the last newline in the file, i.e. the end of its last complete line (0 if there is none)
+def _line_end(path):
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - (1 << 16))
+            f.seek(start)
+            block = f.read(end - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+# Field count of each record of the file from byte `start` to `stop` (blank lines skipped), or None if it is not CSV text
+def _field_counts(path, start, stop):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        try:
+            text = f.read(stop - start).decode('utf-8')
+            return [len(record) for record in csv.reader(io.StringIO(text, newline = '')) if record]
+        except (UnicodeDecodeError, csv.Error):
+            return None
+
+
+# Normalized rows of the file from byte `start` to the end, or to `stop` for a tail; header is the column list, for a
+# tail that has none
+def _parse(path, start, header, chunksize, stop = None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        if start == 0:
+            chunks = pd.read_csv(f, usecols = COLUMNS, dtype = schemas.COVID_PRISON_CASES, chunksize = chunksize)
+        else:
+            tail = io.BytesIO(f.read(-1 if stop is None else stop - start))
+            chunks = pd.read_csv(tail, names = header, header = None, usecols = COLUMNS, dtype = schemas.COVID_PRISON_CASES, chunksize = chunksize)
+        frames = [_normalize(chunk) for chunk in chunks]
+    return pd.concat(frames, ignore_index = True) if frames else pd.DataFrame(columns = COLUMNS)
+
+
+# Download url from byte `start` on into a temporary file
+# Returns (path, offset in the source of the file's first byte, etag), or (None, start, etag) on 304 Not Modified
+def _fetch_from(url, start, etag = None):
+    request = urllib.request.Request(url)
+    if start > 0:
+        request.add_header('Range', 'bytes=' + str(start) + '-')
+    if etag:
+        request.add_header('If-None-Match', etag)
+    try:
+        response = urllib.request.urlopen(request, timeout = snapshots.TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, start, etag
+        raise
+
+    first = 0
+    if response.status == 206:
+        first = int(re.match(r'bytes (\d+)-', response.headers.get('Content-Range', '')).group(1))
+    fd, tmp = tempfile.mkstemp(dir = snapshots.SNAPSHOT_DIR, suffix = '.csv.tmp')
+    with response, os.fdopen(fd, 'wb') as f:
+        for block in iter(lambda: response.read(1 << 16), b''):
+            f.write(block)
+    return tmp, first, response.headers.get('ETag')
+
+
+# Checksum of the first `length` bytes of url, from a range request (or the start of the body, if Range is ignored)
+def _fetch_head(url, length):
+    request = urllib.request.Request(url, headers = {'Range': 'bytes=0-' + str(length - 1)})
+    with urllib.request.urlopen(request, timeout = snapshots.TIMEOUT) as response:
+        return hashlib.sha256(response.read(length)).hexdigest()
+
+
+# Checksum of the BOUNDARY_BYTES before source offset `end`, in a file that starts at source offset `first`
+def _boundary(path, first, end):
+    return _sha256(path, max(0, end - BOUNDARY_BYTES) - first, end - first)
+
+
+# Checksum of an unterminated last line past source offset `end`, which is ingested but not yet a segment, or None
+def _partial(path, first, end):
+    size = os.path.getsize(path)
+    return _sha256(path, end - first, size) if first + size > end else None
+
+
+# Parse the whole downloaded file into a new history
+def _rebuild(url, tmp, etag, chunksize):
+    with open(tmp, newline = '') as f:
+        header = next(csv.reader(f))
+    with open(tmp, 'rb') as f:
+        header_end = len(f.readline())
+    end = _line_end(tmp)
+    now = time.time()
+    meta = {'url': url, 'etag': etag, 'header': header, 'header_end': header_end, 'header_sha256': _sha256(tmp, 0, header_end), 'segments': [{'end': end, 'sha256': _sha256(tmp, 0, end)}],
+            'boundary_sha256': _boundary(tmp, 0, end), 'partial_sha256': _partial(tmp, 0, end), 'fetched_at': now, 'full_checked_at': now}
+    return _indexed(_parse(tmp, 0, header, chunksize)), meta
+
+
+# Append the rows past the last ingested byte to the stored history
+# tmp holds the source from byte `first` on: either the boundary window and the tail, or (first == 0) the whole file.
+# Returns (history, meta), or None if the bytes already ingested, the header or the shape of the rows have changed and
+# the history must be rebuilt.
+def _append(meta, tmp, first, etag, chunksize):
+    end = meta['segments'][-1]['end']
+    size = os.path.getsize(tmp)
+    if first + size < end:
+        return None
+    meta = dict(meta, etag = etag, fetched_at = time.time())
+    if first == 0:
+        start = 0
+        for segment in meta['segments']:
+            if _sha256(tmp, start, segment['end']) != segment['sha256']:
+                return None
+            start = segment['end']
+        meta['full_checked_at'] = meta['fetched_at']
+    elif first != max(0, end - BOUNDARY_BYTES) or _boundary(tmp, first, end) != meta['boundary_sha256']:
+        return None
+    # The boundary window does not reach the header; it is checked on its own before new rows are parsed against it
+    elif first + size > end and ('header_sha256' not in meta or _fetch_head(meta['url'], meta['header_end']) != meta['header_sha256']):
+        return None
+
+    history = pd.read_parquet(_path())
+    meta['partial_sha256'] = None
+    if first + size == end:
+        return history, meta
+    new_end = max(end, first + _line_end(tmp))
+    counts = _field_counts(tmp, end - first, new_end - first)
+    if counts is None or any(count != len(meta['header']) for count in counts):
+        return None
+    # The tail may end in a line without a newline. If it already has every field it is parsed now and again next time,
+    # when it is complete, and the duplicate (as_of_date, name) keeps the later copy; a line cut off earlier waits.
+    partial = first + size > new_end and _field_counts(tmp, new_end - first, size) == [len(meta['header'])]
+    stop = size if partial else new_end - first
+    if stop == end - first:
+        return history, meta
+    try:
+        rows = _parse(tmp, end - first, meta['header'], chunksize, stop)
+    except ValueError:
+        return None
+    if new_end > end:
+        meta['segments'] = meta['segments'] + [{'end': new_end, 'sha256': _sha256(tmp, end - first, new_end - first)}]
+        meta['boundary_sha256'] = _boundary(tmp, first, new_end)
+    meta['partial_sha256'] = _partial(tmp, first, new_end) if partial else None
+    return _indexed(pd.concat([history.reset_index(), rows], ignore_index = True)), meta
+
+
+def _ingest_online(url, chunksize):
+    os.makedirs(snapshots.SNAPSHOT_DIR, exist_ok = True)
+    meta = snapshots.metadata(HISTORY_NAME)
+    usable = _usable(meta, url)
+    if usable and time.time() - meta.get('fetched_at', 0) < snapshots.MAX_AGE:
+        return pd.read_parquet(_path())
+
+    full_check = not usable or time.time() - meta.get('full_checked_at', 0) >= FULL_CHECK_AGE
+    start = 0 if full_check else max(0, meta['segments'][-1]['end'] - BOUNDARY_BYTES)
+    tmp = None
+    try:
+        try:
+            # A full check is unconditional: the stored ETag may come from a tail fetch, which verified only the boundary
+            tmp, first, etag = _fetch_from(url, start, meta.get('etag') if usable and start > 0 else None)
+        except urllib.error.HTTPError as e:
+            # 416: the source is now shorter than what was ingested
+            if e.code != 416:
+                raise
+            tmp, first, etag = _fetch_from(url, 0)
+
+        if tmp is None:
+            # 304 Not Modified since the last tail fetch
+            result = pd.read_parquet(_path()), dict(meta, fetched_at = time.time())
+        else:
+            result = _append(meta, tmp, first, etag, chunksize) if usable else None
+            if result is None:
+                if first != 0:
+                    os.remove(tmp)
+                    tmp, first, etag = _fetch_from(url, 0)
+                result = _rebuild(url, tmp, etag, chunksize)
+    except (urllib.error.URLError, OSError):
+        # Serve the stored history rather than failing the page when upstream is unreachable
+        if usable:
+            return pd.read_parquet(_path())
+        raise
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+    history, meta = result
+    history.to_parquet(_path())
+    snapshots.write_metadata(HISTORY_NAME, meta)
+    return history
+
+
+# Concurrent online ingests share one fetch (single_flight)
+def ingest(name, url, chunksize = CHUNKSIZE):
+    if not snapshots.OFFLINE:
+        return single_flight.run(('history', name), _ingest_online, url, chunksize)
+
+    # Offline: a history stored by an earlier online run, else the local snapshot of the source (e.g. a fixture CSV)
+    if _usable(snapshots.metadata(HISTORY_NAME), url):
+        return pd.read_parquet(_path())
+    source = snapshots.refresh(name, url)
+    return _indexed(pd.concat([_normalize(chunk) for chunk in snapshots.iter_chunks(source, COLUMNS, chunksize, dtype = schemas.COVID_PRISON_CASES)], ignore_index = True))
+
+
+def is_fresh(url):
+    meta = snapshots.metadata(HISTORY_NAME)
+    return _usable(meta, url) and time.time() - meta.get('fetched_at', 0) < snapshots.MAX_AGE
+
+
+# Identifies the ingested content: the checksums of the ingested byte ranges, or the local snapshot's version offline
+def version(name):
+    meta = snapshots.metadata(HISTORY_NAME)
+    if meta is not None and meta.get('segments'):
+        checksums = [segment['sha256'] for segment in meta['segments']] + [meta.get('partial_sha256') or '']
+        return hashlib.sha256(''.join(checksums).encode()).hexdigest()
+    return snapshots.version(name)
+
+
+def dates(history):
+    return history.index.get_level_values('as_of_date').unique()
+
+
+def latest_date(history):
+    return dates(history).max()
+
+
+# All rows reported as of `as_of_date` (the latest report if None); a lookup on the sorted index, not a scan
+def select(history, as_of_date = None):
+    if as_of_date is None:
+        as_of_date = latest_date(history)
+    return history.xs(pd.Timestamp(as_of_date), level = 'as_of_date')
@@ -1,8 +1,15 @@
 import streamlit as st
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
-import pandas as pd
 from datetime import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset
+import refresher
+
+refresher.start()
 
 # Add sidebar for navigation, slider (see how these variables changed with respect to each other over the course of the
 # outbreak), keep scale same across time (for slider), prob need st.cache,
@@ -13,31 +20,12 @@ from datetime import datetime
 # and because of subplots' scale, doesn't make a discernable difference
 
 
-COVID_PRISON_DATA_URL = ('https://raw.githubusercontent.com/themarshallproject/COVID_prison_data/master/data/covid_prison_cases.csv')
-covid_prison_data = pd.read_csv(COVID_PRISON_DATA_URL, nrows = 50,
-                    names = ["name", "abbreviation", "staff_tests", "staff_tests_with_multiples", "prisoner_tests", "prisoner_tests_with_multiples",
-                            "total_staff_cases", "total_prisoner_cases", "staff_recovered", "prisoners_recovered", "total_staff_deaths","total_prisoner_deaths",
-                            "as_of_date", "notes"],
-                    usecols = ["name", "total_prisoner_cases", "total_prisoner_deaths"],
-                    skiprows = 1, # Change according to date
-                    )
-covid_prison_data["Prison_CFR"] = covid_prison_data["total_prisoner_deaths"] * 100 / covid_prison_data["total_prisoner_cases"]
-
-
-COVID_DATA_URL = ('https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_daily_reports_us/07-21-2020.csv') # Change according to date
-covid_data = pd.read_csv(COVID_DATA_URL, nrows = 50,
-                    names = ["Province_State", "Country_Region", "Last_Update", "Lat", "Long_", "Confirmed", "Deaths", "Recovered", "Active", "FIPS",
-                            "Incident_Rate", "People_Tested", "People_Hospitalized", "Mortality_Rate", "UID", "ISO3", "Testing_Rate", "Hospitalization_Rate"],
-                    usecols = ["Province_State", "Mortality_Rate"],
-                    skiprows = [0, 3, 10, 11, 14, 15, 40, 45, 53],
-                    )
-covid_data = covid_data.rename(columns = {'Mortality_Rate': 'State_CFR'})
-
-
-combined_data = pd.concat([covid_prison_data, covid_data], axis = 1)
-combined_data = combined_data.drop(columns = "total_prisoner_cases")
-combined_data = combined_data.drop(columns = "total_prisoner_deaths")
-combined_data = combined_data.drop(columns = "Province_State")
+# Sources and frames come from the process-wide cache in dataset.py, shared with covid-prisons.py, so they are
+# fetched and loaded once per dataset version rather than on every rerun of every page
+data = dataset.load()
+covid_prison_data = data['covid_prison_data'][['name', 'total_prisoner_cases', 'total_prisoner_deaths', 'Prison_CFR']]
+covid_data = data['covid_data'][['Province_State', 'State_CFR']]
+combined_data = data['combined_data'][['name', 'Prison_CFR', 'State_CFR']]
 
 
 # Based off grid from http://awesome-streamlit.org --> Gallery --> "Layout and Style Experiments"
@@ -271,7 +259,7 @@ bar_chart.add_trace(go.Bar(
     marker_color = '#000000',
 ))
 bar_chart.update_layout(
-    xaxis_title = 'COVID-19 Case-Fatality Ratio (deaths per 100 confirmed cases)',
+    xaxis_title = 'COVID-19 Case-Fatality Ratio (deaths per 100000 confirmed cases)',
     yaxis_title = 'State',
     width = 1000,
     height = 1100,
@@ -286,7 +274,7 @@ st.write(bar_chart)
 
 # Show data with Streamlit
 st.markdown('<h3>Data</h3>', unsafe_allow_html = True)
-as_of_date = datetime.strptime(COVID_DATA_URL[115: -4], '%m-%d-%Y').strftime('%B %d, %Y')
+as_of_date = datetime.strptime(data['data_date'], '%m-%d-%Y').strftime('%B %d, %Y')
 st.write('As of ' + as_of_date + '.')
 
 st.markdown('<h4>COVID-19 in US State Prisons</h4>', unsafe_allow_html = True)
@@ -303,7 +291,7 @@ st.write(combined_data)
 
 # Explanation of epidemiological terms, potential problems, and other discussion
 st.markdown('<h3>Epidemiological terms, caveats, discussion</h3>', unsafe_allow_html = True)
-st.markdown('Case-fatality ratio is an epidemiological measure of mortality. A formula for case-fatality ratio is as follows: <i>number of recorded deaths * 100 / number of confirmed cases</i>.', unsafe_allow_html = True)
+st.markdown('Case-fatality ratio is an epidemiological measure of mortality. A formula for case-fatality ratio is as follows: <i>number of recorded deaths * 100000 / number of confirmed cases</i>.', unsafe_allow_html = True)
 st.write('Some caveats include: (1) underreporting, (2) at any given moment, the instantaneous numbers may not reflect the ultimate numbers (e.g. uncertainty regarding ultimate number of deaths).')
 st.write('Also note: federal prisons were excluded from these analyses, since the Marshall data placed them in a separate category (rather than grouping them with their state\'s data). The Marshall data did not include D.C. data, so D.C. was also omitted from these analyses. Finally&#8212I\'m assuming due to some sizing or rendering error&#8212some bars of the bar charts inside the map floated just above their zerolines; to fix this, I offset the y-ranges by a tiny amount. The map is only intended to show relative heights, and the scale of each bar chart is small enough that the offset doesn\'t make a discernable difference, but nonetheless, I\'m not sure if this is bad practice? (Feel free to roast me if it is.)')
 st.write('In addition, prison mortality rates were estimated using population figures retrieved as early as January 2020.')
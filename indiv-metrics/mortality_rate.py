@@ -1,8 +1,15 @@
 import streamlit as st
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
-import pandas as pd
 from datetime import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset
+import refresher
+
+refresher.start()
 
 # Add data & visualizaions for prevalence, then combine all 3 metrics into one page & animate
 
@@ -10,46 +17,13 @@ from datetime import datetime
 # of the outbreak), keep scale same across time (for slider), prob need st.cache
 
 
-PRISON_POP_DATA_URL = ('https://raw.githubusercontent.com/themarshallproject/COVID_prison_data/master/data/prison_populations.csv')
-prison_pop_data = pd.read_csv(PRISON_POP_DATA_URL, nrows = 50,
-                    names = ["name", "abbreviation", "april_pop", "as_of_date"],
-                    usecols = ["name", "april_pop", "as_of_date"],
-                    skiprows = 1,
-                    )
-nationwide_prison_pop_data = {"name": "NATIONWIDE", "april_pop": prison_pop_data.sum(0).loc["april_pop"], "as_of_date": "N/A"}
-prison_pop_data = prison_pop_data.append(nationwide_prison_pop_data, ignore_index = True)
-
-COVID_PRISON_DATA_URL = ('https://raw.githubusercontent.com/themarshallproject/COVID_prison_data/master/data/covid_prison_cases.csv')
-covid_prison_data = pd.read_csv(COVID_PRISON_DATA_URL, nrows = 50,
-                    names = ["name", "abbreviation", "staff_tests", "staff_tests_with_multiples", "prisoner_tests", "prisoner_tests_with_multiples",
-                            "total_staff_cases", "total_prisoner_cases", "staff_recovered", "prisoners_recovered", "total_staff_deaths","total_prisoner_deaths",
-                            "as_of_date", "notes"],
-                    usecols = ["name", "total_prisoner_deaths"],
-                    skiprows = 1, # Change according to date
-                    )
-covid_prison_data["Prison_MR"] = covid_prison_data["total_prisoner_deaths"] * 100000 / prison_pop_data["april_pop"]
-nationwide_covid_prison_data = {"name": "NATIONWIDE", "total_prisoner_deaths": covid_prison_data.sum(0).loc["total_prisoner_deaths"], "Prison_MR": ""}
-nationwide_covid_prison_data["Prison_MR"] = nationwide_covid_prison_data["total_prisoner_deaths"] * 100000 / prison_pop_data.sum(0).loc["april_pop"]
-covid_prison_data = covid_prison_data.append(nationwide_covid_prison_data, ignore_index = True)
-
-
-COVID_DATA_URL = ('https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_daily_reports_us/07-21-2020.csv') # Change according to date
-covid_data = pd.read_csv(COVID_DATA_URL, nrows = 50,
-                    names = ["Province_State", "Country_Region", "Last_Update", "Lat", "Long_", "Confirmed", "Deaths", "Recovered", "Active", "FIPS",
-                            "Incident_Rate", "People_Tested", "People_Hospitalized", "Mortality_Rate", "UID", "ISO3", "Testing_Rate", "Hospitalization_Rate"],
-                    usecols = ["Province_State", "Confirmed", "Deaths", "Incident_Rate"],
-                    skiprows = [0, 3, 10, 11, 14, 15, 40, 45, 53],
-                    )
-covid_data["population"] = (covid_data["Confirmed"] * 100000 / covid_data["Incident_Rate"]).astype(int)
-covid_data["State_MR"] = covid_data["Deaths"] * 100000 / covid_data["population"]
-nationwide_covid_data = {"Province_State": "NATIONWIDE", "Confirmed": covid_data.sum(0).loc["Confirmed"], "Deaths": covid_data.sum(0).loc["Deaths"], "Incident_Rate": "", "population": covid_data.sum(0).loc["population"], "State_MR": ""}
-nationwide_covid_data["Incident_Rate"] = nationwide_covid_data["Confirmed"] * 100000 / nationwide_covid_data["population"]
-nationwide_covid_data["State_MR"] = nationwide_covid_data["Deaths"] * 100000 / nationwide_covid_data["population"]
-covid_data = covid_data.append(nationwide_covid_data, ignore_index = True)
-
-
-combined_data = pd.concat([covid_prison_data, covid_data], axis = 1)
-combined_data = combined_data.drop(columns = ["total_prisoner_deaths", "Province_State", "Confirmed", "Deaths", "Incident_Rate", "population"])
+# Sources and frames come from the process-wide cache in dataset.py, shared with covid-prisons.py, so they are
+# fetched and loaded once per dataset version rather than on every rerun of every page
+data = dataset.load()
+prison_pop_data = data['prison_pop_data']
+covid_prison_data = data['covid_prison_data'][['name', 'total_prisoner_deaths', 'Prison_MR']]
+covid_data = data['covid_data'][['Province_State', 'Confirmed', 'Deaths', 'population', 'State_MR']]
+combined_data = data['combined_data'][['name', 'Prison_MR', 'State_MR']]
 
 
 # Based off grid from http://awesome-streamlit.org --> Gallery --> "Layout and Style Experiments"
@@ -301,7 +275,7 @@ st.write(bar_chart)
 
 # Show data with Streamlit
 st.markdown('<h3>Data</h3>', unsafe_allow_html = True)
-as_of_date = datetime.strptime(COVID_DATA_URL[115: -4], '%m-%d-%Y').strftime('%B %d, %Y')
+as_of_date = datetime.strptime(data['data_date'], '%m-%d-%Y').strftime('%B %d, %Y')
 st.write('As of ' + as_of_date + '.')
 
 st.markdown('<h4>COVID-19 in US State Prisons</h4>', unsafe_allow_html = True)
@@ -0,0 +1,94 @@
+import numpy as np
+
+# Metric engine for prison and state rates
+# Inputs are numeric arrays with states on the last axis (in states.STATE_CODES order); any leading axes, e.g. dates,
+# broadcast. Every output has one more element on the last axis: the NATIONWIDE aggregate, computed from the summed
+# counts and denominators in the same pass, so no row dicts or appends are needed.
+PER_100K = 100000
+
+
+# Append the sum over states as the last element
+def with_nationwide(values):
+    values = np.asarray(values, dtype = np.float64)
+    return np.concatenate([values, np.nansum(values, axis = -1, keepdims = True)], axis = -1)
+
+
+def per_100k(numerator, denominator):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return numerator * PER_100K / denominator
+
+
+# Prison case rate, mortality rate and case-fatality ratio, per 100,000, from cumulative counts and prison population
+def prison_metrics(cases, deaths, population):
+    cases = with_nationwide(cases)
+    deaths = with_nationwide(deaths)
+    population = with_nationwide(population)
+    return {
+        'total_prisoner_cases': cases,
+        'total_prisoner_deaths': deaths,
+        'Prison_CR': per_100k(cases, population),
+        'Prison_MR': per_100k(deaths, population),
+        'Prison_CFR': per_100k(deaths, cases),
+    }
+
+
+# State rates from a JHU daily report
+# JHU provides Incident_Rate (cases per 100,000) and Mortality_Rate (deaths per 100 cases) per state; population is
+# backed out of Incident_Rate. The NATIONWIDE rates are recomputed from the summed counts and populations.
+def state_metrics(confirmed, deaths, incident_rate, mortality_rate):
+    incident_rate = np.asarray(incident_rate, dtype = np.float64)
+    mortality_rate = np.asarray(mortality_rate, dtype = np.float64)
+    population = with_nationwide(np.trunc(per_100k(np.asarray(confirmed, dtype = np.float64), incident_rate)))
+    confirmed = with_nationwide(confirmed)
+    deaths = with_nationwide(deaths)
+    return {
+        'Confirmed': confirmed,
+        'Deaths': deaths,
+        'State_CR': np.concatenate([incident_rate, per_100k(confirmed[..., -1:], population[..., -1:])], axis = -1),
+        'State_CFR': np.concatenate([mortality_rate * 1000, per_100k(deaths[..., -1:], confirmed[..., -1:])], axis = -1),
+        'population': population,
+        'State_MR': per_100k(deaths, population),
+    }
+
+
+# Rolling windows
+# Cumulative counts reported on arbitrary dates (weekly for the prisons, daily for JHU) are put on one daily grid, each
+# day carrying the latest report on or before it; new counts over a window are then the difference of that series with
+# itself shifted by the window. Everything is array indexing over all states at once, with dates on the first axis.
+# A report a state missed stays missing: it is not carried over from the report before, so no window starts or ends on
+# it, and the days after a state's last report are missing too. Missing is never read as "no new cases".
+WINDOWS = [7, 14, 28]
+
+
+# Values reported on `days` (sorted day numbers on the grid) as a `length`-day grid
+# Each day takes the latest report on or before it, as reported, NaN for a state that missed that report; days before
+# the first report and after the last one are NaN
+def on_grid(values, days, length):
+    values = np.asarray(values, dtype = np.float64)
+    days = np.asarray(days)
+    rows = np.searchsorted(days, np.arange(length), side = 'right') - 1
+    grid = values[np.maximum(rows, 0)]
+    grid[(rows < 0) | (np.arange(length) > days[-1])] = np.nan
+    return grid
+
+
+# New counts over the `window` days ending on each day of a cumulative daily series; NaN for the first window days
+def new_in_window(cumulative, window):
+    new = np.full(cumulative.shape, np.nan)
+    new[window:] = cumulative[window:] - cumulative[:-window]
+    return new
+
+
+# New cases and deaths per 100,000 over each of WINDOWS, as {prefix + 'CR7': ..., prefix + 'MR7': ..., ...}
+# cases and deaths are cumulative daily series (days, states). NATIONWIDE is the rate over the states with a value for
+# the window, counts and population alike, and NaN where there are none.
+def window_metrics(prefix, cases, deaths, population, windows = WINDOWS):
+    population = np.asarray(population, dtype = np.float64)
+    rates = {}
+    for window in windows:
+        for metric, counts in (('CR', cases), ('MR', deaths)):
+            new = new_in_window(counts, window)
+            known = ~np.isnan(new) & ~np.isnan(population)
+            nationwide = per_100k(np.where(known, new, 0).sum(axis = -1), np.where(known, population, 0).sum(axis = -1))
+            rates[prefix + metric + str(window)] = np.concatenate([per_100k(new, population), nationwide[..., np.newaxis]], axis = -1)
+    return rates
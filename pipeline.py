@@ -0,0 +1,142 @@
+import csv
+import hashlib
+import io
+import logging
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import history
+import snapshots
+
+# Concurrent fetch stage for the three upstream sources
+# Prison populations and prison cases are independent, so they download (and parse into snapshots) side by side.
+# The JHU daily report depends on the latest prison-case date; rather than waiting for the full prison-case file, the
+# date is peeked from the first and last few KB of it and the daily report is fetched speculatively. If the full
+# ingest turns out to have a different latest date, the right daily report is fetched afterwards. The two JHU time series
+# (for the rolling-window state rates) refresh alongside; they are optional, and a failed fetch only leaves those
+# rates missing.
+PRISON_POP_DATA_URL = ('https://raw.githubusercontent.com/themarshallproject/COVID_prison_data/master/data/prison_populations.csv')
+COVID_PRISON_DATA_URL = ('https://raw.githubusercontent.com/themarshallproject/COVID_prison_data/master/data/covid_prison_cases.csv')
+COVID_DATA_BASE_URL = ('https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_daily_reports_us/')
+# JHU US time series, one row per county and one column per day; see time_series.py
+TIME_SERIES_BASE_URL = ('https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/')
+PEEK_BYTES = 8192
+
+logger = logging.getLogger(__name__)
+
+
+def covid_data_url(data_date):
+    return COVID_DATA_BASE_URL + data_date + '.csv'
+
+
+# measure is 'confirmed' or 'deaths'
+def time_series_name(measure):
+    return 'time_series_covid19_' + measure + '_US'
+
+
+def time_series_url(measure):
+    return TIME_SERIES_BASE_URL + time_series_name(measure) + '.csv'
+
+
+def _read_range(url, byte_range):
+    request = urllib.request.Request(url, headers = {'Range': 'bytes=' + byte_range})
+    with urllib.request.urlopen(request, timeout = snapshots.TIMEOUT) as response:
+        return response.read(PEEK_BYTES).decode('utf-8', errors = 'replace')
+
+
+# Best guess at the latest as_of_date in the prison-case file from its first and last PEEK_BYTES, or None
+def peek_latest_date(url):
+    try:
+        head = _read_range(url, '0-' + str(PEEK_BYTES - 1))
+        tail = _read_range(url, '-' + str(PEEK_BYTES))
+    except OSError:
+        return None
+    header = next(csv.reader(io.StringIO(head)))
+    if 'as_of_date' not in header:
+        return None
+    column = header.index('as_of_date')
+    rows = list(csv.reader(io.StringIO(head)))[1:-1] + list(csv.reader(io.StringIO(tail)))[1:]
+    found = pd.to_datetime([row[column] for row in rows if len(row) == len(header)], errors = 'coerce').dropna()
+    return found.max().strftime('%m-%d-%Y') if len(found) else None
+
+
+# Local path of a time series, or None if it can neither be fetched nor found on disk
+def _refresh_time_series(measure):
+    try:
+        return snapshots.refresh(time_series_name(measure), time_series_url(measure), raw = True)
+    except OSError:
+        return None
+
+
+def _timed(timings, stage, function, *args):
+    start = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+# Bring all three sources into the snapshot store; returns the date of the JHU daily report and per-stage wall-clock
+# timings in seconds
+def prefetch():
+    timings = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = 5) as pool:
+        prison_pop = pool.submit(_timed, timings, 'prison_populations', snapshots.refresh, 'prison_populations', PRISON_POP_DATA_URL)
+        prison_cases = pool.submit(_timed, timings, 'covid_prison_cases', history.ingest, 'covid_prison_cases', COVID_PRISON_DATA_URL)
+        time_series = [pool.submit(_timed, timings, 'time_series_' + measure, _refresh_time_series, measure) for measure in ('confirmed', 'deaths')]
+
+        guess = None
+        covid = None
+        if not snapshots.OFFLINE and not history.is_fresh(COVID_PRISON_DATA_URL):
+            guess = _timed(timings, 'peek_date', peek_latest_date, COVID_PRISON_DATA_URL)
+            if guess is not None:
+                covid = pool.submit(_timed, timings, 'daily_report', snapshots.refresh, guess, covid_data_url(guess))
+
+        data_date = history.latest_date(prison_cases.result()).strftime('%m-%d-%Y')
+        if data_date != guess:
+            if covid is not None:
+                logger.info('peeked date %s did not match latest date %s', guess, data_date)
+            covid = pool.submit(_timed, timings, 'daily_report', snapshots.refresh, data_date, covid_data_url(data_date))
+        prison_pop.result()
+        covid.result()
+        for future in time_series:
+            future.result()
+    timings['total'] = time.perf_counter() - start
+    logger.info('prefetch timings: %s', ', '.join(stage + ' ' + format(seconds, '.3f') + 's' for stage, seconds in timings.items()))
+    return data_date, timings
+
+
+# Bring the JHU daily report for each of data_dates into the snapshot store, side by side
+# Returns {data_date: local path} for the reports that are available; early dates predate the US daily reports, and
+# offline mode only has what is on disk, so missing reports are skipped rather than failing the timeline
+def prefetch_daily_reports(data_dates, max_workers = 8):
+    def local_path(data_date):
+        try:
+            return snapshots.refresh(data_date, covid_data_url(data_date))
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+        paths = list(pool.map(local_path, data_dates))
+    return {data_date: path for data_date, path in zip(data_dates, paths) if path is not None}
+
+
+# Identifies the combination of source snapshots behind a page, for keying derived data and figures
+def dataset_version(data_date):
+    versions = [snapshots.version('prison_populations'), history.version('covid_prison_cases'), snapshots.version(data_date)]
+    for measure in ('confirmed', 'deaths'):
+        try:
+            versions.append(snapshots.version(time_series_name(measure)))
+        except FileNotFoundError:
+            versions.append('')
+    return hashlib.sha256('\n'.join(versions).encode()).hexdigest()[:16]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level = logging.INFO, stream = sys.stdout, format = '%(message)s')
+    prefetch()
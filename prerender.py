@@ -0,0 +1,165 @@
+import argparse
+import html
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import charts
+import dataset
+
+# Static pre-render of the three metric pages
+# `python prerender.py` fetches the sources, builds the same grid map and bar chart as the Streamlit page for each
+# metric, and writes one HTML file per metric plus index.html into OUTPUT_DIR. The pages share a single plotly.min.js
+# next to them and carry the data tables, so the directory can be served from any static host. prerender.json records
+# the dataset version the pages were built from; a run against an unchanged version writes nothing.
+OUTPUT_DIR = os.environ.get('COVID_PRISONS_PRERENDER_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site'))
+MANIFEST = 'prerender.json'
+PLOTLY_JS = 'plotly.min.js'
+# (file name, radio label, metric), in the page's radio order; the first one is also index.html
+PAGES = [
+    ('case-rate.html', 'Case Rate', 'CR'),
+    ('mortality-rate.html', 'Mortality Rate', 'MR'),
+    ('case-fatality-ratio.html', 'Case-Fatality Ratio', 'CFR'),
+]
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>COVID-19 in US Prisons, as Told by Data: %(label)s</title>
+<script src="%(plotly_js)s"></script>
+<style>
+body { font-family: 'IBM Plex Sans', sans-serif; max-width: 1000px; margin: 2em auto; }
+nav a { margin-right: 2em; }
+nav a.active { font-weight: bold; color: #000000; text-decoration: none; }
+table { border-collapse: collapse; font-size: 13px; margin-bottom: 1em; }
+td, th { padding: 2px 8px; text-align: right; border-bottom: 1px solid #dddddd; }
+</style>
+</head>
+<body>
+<h1>COVID-19 in US Prisons, as Told by Data</h1>
+<nav>%(nav)s</nav>
+%(grid)s
+%(bar_chart)s
+<details>
+<summary>Show Data</summary>
+<p>Data as of %(as_of_date)s (except prison population data, for which date is indicated in the datatable).</p>
+%(tables)s
+</details>
+<p>Generated %(generated_at)s from dataset version %(dataset_version)s.</p>
+</body>
+</html>
+'''
+
+TABLES = [
+    ('US State Prison Populations', 'prison_pop_data', None,
+     '<a href="https://github.com/themarshallproject/COVID_prison_data">Data</a> from The Marshall Project, a nonprofit investigative newsroom dedicated to the U.S. criminal justice system.'),
+    ('COVID-19 in US State Prisons', 'covid_prison_data', ['name', 'total_prisoner_cases', 'total_prisoner_deaths', 'Prison_CR', 'Prison_MR', 'Prison_CFR'],
+     '<a href="https://github.com/themarshallproject/COVID_prison_data">Data</a> from The Marshall Project, a nonprofit investigative newsroom dedicated to the U.S. criminal justice system.'),
+    ('COVID-19 in US States', 'covid_data', ['Province_State', 'Confirmed', 'Deaths', 'population', 'State_CR', 'State_MR', 'State_CFR'],
+     '<a href="https://github.com/CSSEGISandData/COVID-19">Data</a> from the COVID-19 Data Repository by the Center for Systems Science and Engineering (CSSE) at Johns Hopkins University.'),
+    ('Side-by-Side Comparison', 'combined_data', ['name', 'Prison_CR', 'State_CR', 'Prison_MR', 'State_MR', 'Prison_CFR', 'State_CFR'], ''),
+]
+
+
+def manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write(output_dir, name, text):
+    fd, tmp = tempfile.mkstemp(dir = output_dir, suffix = '.tmp')
+    with os.fdopen(fd, 'w', encoding = 'utf-8') as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, os.path.join(output_dir, name))
+
+
+def tables_html(data):
+    parts = []
+    for title, key, columns, source in TABLES:
+        frame = data[key] if columns is None else data[key][columns]
+        parts.append('<h4>' + html.escape(title) + '</h4>\n' + frame.to_html(na_rep = 'NaN', float_format = lambda value: format(value, ',.2f'))
+                     + ('\n<p>' + source + '</p>' if source else ''))
+    return '\n'.join(parts)
+
+
+def render_page(data, file_name, label, metric, renderer):
+    color = charts.color(metric)
+    grid = charts.GRID_RENDERERS[renderer](data['grid_values'], metric, color)
+    bar_chart = charts.make_bar_chart(data['combined_data'], metric, color)
+    nav = ' '.join('<a href="' + name + '"' + (' class="active"' if name == file_name else '') + '>' + html.escape(other) + '</a>'
+                   for name, other, _ in PAGES)
+    return PAGE % {
+        'label': html.escape(label),
+        'plotly_js': PLOTLY_JS,
+        'nav': nav,
+        'grid': pio.to_html(grid, include_plotlyjs = False, full_html = False, div_id = 'grid'),
+        'bar_chart': pio.to_html(bar_chart, include_plotlyjs = False, full_html = False, div_id = 'bar-chart'),
+        'as_of_date': datetime.strptime(data['data_date'], '%m-%d-%Y').strftime('%B %d, %Y'),
+        'tables': data['tables'],
+        'generated_at': data['generated_at'],
+        'dataset_version': data['dataset_version'],
+    }
+
+
+# Write the pages for the current dataset version into output_dir, unless they are already there
+# Returns the manifest of what is on disk afterwards, with 'written' True if the pages were (re)generated
+def prerender(output_dir = OUTPUT_DIR, renderer = 'subplots', force = False):
+    data_date, dataset_version, _ = dataset.source()
+    current = manifest(output_dir)
+    if not force and current is not None and current.get('dataset_version') == dataset_version and current.get('renderer') == renderer \
+            and all(os.path.exists(os.path.join(output_dir, name)) for name in current.get('files', [])):
+        return dict(current, written = False)
+
+    data = dict(dataset.load(), generated_at = time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()))
+    data_date = data['data_date']
+    dataset_version = data['dataset_version']
+    data['tables'] = tables_html(data)
+
+    os.makedirs(output_dir, exist_ok = True)
+    # plotly.js only changes with the plotly package, so it is rewritten only when that changes
+    if current is None or current.get('plotly_version') != plotly.__version__ or not os.path.exists(os.path.join(output_dir, PLOTLY_JS)):
+        _write(output_dir, PLOTLY_JS, get_plotlyjs())
+    files = [PLOTLY_JS]
+    for file_name, label, metric in PAGES:
+        page = render_page(data, file_name, label, metric, renderer)
+        _write(output_dir, file_name, page)
+        files.append(file_name)
+        if file_name == PAGES[0][0]:
+            _write(output_dir, 'index.html', page)
+            files.append('index.html')
+    # The manifest goes last, so an interrupted run is redone next time
+    current = {'dataset_version': dataset_version, 'data_date': data_date, 'renderer': renderer, 'plotly_version': plotly.__version__,
+               'generated_at': data['generated_at'], 'files': files}
+    _write(output_dir, MANIFEST, json.dumps(current, indent = 2))
+    return dict(current, written = True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Pre-render the metric pages as static HTML')
+    parser.add_argument('--output', default = OUTPUT_DIR, help = 'directory to write the pages to')
+    parser.add_argument('--renderer', default = os.environ.get('COVID_PRISONS_GRID_RENDERER', 'subplots'), choices = sorted(charts.GRID_RENDERERS))
+    parser.add_argument('--force', action = 'store_true', help = 'write the pages even if the dataset version is unchanged')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = prerender(args.output, args.renderer, args.force)
+    if result['written']:
+        print('wrote ' + ', '.join(result['files']) + ' to ' + args.output + ' in ' + format(time.perf_counter() - start, '.2f') + 's')
+    else:
+        print('dataset version ' + result['dataset_version'] + ' unchanged; ' + args.output + ' is up to date')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
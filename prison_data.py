@@ -0,0 +1,159 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import daily_reports
+import history
+import metrics
+import pipeline
+import snapshots
+import states
+import time_series
+
+# Loaders for the prison population, prison case and JHU state data, shared by the Streamlit pages and the benchmarks
+# Each returns a frame indexed by state code (states.INDEX), with the NATIONWIDE row last, in the compact dtypes below.
+COUNTS = ['dec_pop', 'total_prisoner_cases', 'total_prisoner_deaths', 'Confirmed', 'Deaths', 'population']
+NAMES = ['name', 'Province_State']
+DATES = ['as_of_date', 'as_of_date_dec']
+# New cases and deaths per 100,000 over each of metrics.WINDOWS (e.g. Prison_CR7, State_MR28)
+WINDOW_COLUMNS = [series + metric + str(window) for window in metrics.WINDOWS for metric in ('CR', 'MR') for series in ('Prison_', 'State_')]
+
+
+# Memory-compact copy of a loader's frame: state codes and names categorical, counts nullable int32 (a missing report
+# stays missing), dates datetime64 (NaT where there is none, e.g. NATIONWIDE), every other column a float32 rate; no
+# object or string columns are left. Rates are computed in float64 before they get here.
+def compact(frame):
+    columns = {}
+    for column in frame.columns:
+        if column in NAMES:
+            columns[column] = frame[column].astype(states.NAME_DTYPE)
+        elif column in COUNTS:
+            columns[column] = pd.to_numeric(frame[column], errors = 'coerce').round().astype('Int32')
+        elif column in DATES:
+            columns[column] = pd.to_datetime(frame[column], errors = 'coerce', format = 'mixed')
+        else:
+            columns[column] = pd.to_numeric(frame[column], errors = 'coerce').astype(np.float32)
+    index = frame.index
+    if isinstance(index, pd.MultiIndex):
+        index = index.set_levels(pd.CategoricalIndex(index.levels[index.names.index('code')], dtype = states.CODE_DTYPE), level = 'code')
+    else:
+        index = pd.CategoricalIndex(index, dtype = states.CODE_DTYPE, name = 'code')
+    return pd.DataFrame(columns).set_axis(index)
+
+
+# Float64 values of a (possibly nullable integer) column, NaN where missing, for the metric engine
+def numbers(column):
+    return column.to_numpy(dtype = np.float64, na_value = np.nan)
+
+
+# Cumulative prison cases and deaths as (as_of_date x state code) frames
+def prison_counts(prison_history):
+    prison_history = states.keyed(prison_history.reset_index(), 'name').reset_index().set_index(['as_of_date', 'code'])
+    cases = prison_history['total_prisoner_cases'].unstack('code').reindex(columns = states.STATE_CODES)
+    deaths = prison_history['total_prisoner_deaths'].unstack('code').reindex(columns = states.STATE_CODES)
+    return cases, deaths
+
+
+# The JHU time series rolled up to states (time_series.load), or None where it is not available, e.g. offline
+# without a local copy; the rolling-window state rates are then missing rather than failing the page
+def load_state_series():
+    try:
+        return time_series.load()
+    except (OSError, ValueError):
+        return None
+
+
+# Rolling-window rates (metrics.window_metrics) on each of the dates `at`, as {column: (len(at), states + 1) array}
+# Cumulative counts reported on `dates` go onto one daily grid reaching the longest window back from the first of `at`,
+# so weekly prison reports and daily JHU counts are differenced the same way.
+def window_rates(prefix, dates, cases, deaths, population, at):
+    dates = pd.DatetimeIndex(dates)
+    at = pd.DatetimeIndex(at)
+    start = at.min() - pd.Timedelta(days = max(metrics.WINDOWS))
+    length = (at.max() - start).days + 1
+    days = (dates - start).days
+    rates = metrics.window_metrics(prefix, metrics.on_grid(cases, days, length), metrics.on_grid(deaths, days, length), population)
+    return {column: values[(at - start).days] for column, values in rates.items()}
+
+
+# window_rates for the states from the time series, all NaN if there is none
+def state_window_rates(series, at):
+    if series is None:
+        nan = np.full((len(at), len(states.INDEX)), np.nan)
+        return {'State_' + metric + str(window): nan for window in metrics.WINDOWS for metric in ('CR', 'MR')}
+    return window_rates('State_', series['dates'], series['Confirmed'], series['Deaths'], series['population'], at)
+
+
+def load_prison_pop_data():
+    prison_pop_data = snapshots.fetch('prison_populations', pipeline.PRISON_POP_DATA_URL)
+    prison_pop_data = states.keyed(prison_pop_data, 'name').reindex(states.STATE_CODES)
+    population = metrics.with_nationwide(prison_pop_data['dec_pop'])
+    prison_pop_data = pd.DataFrame({'name': states.STATES['name'].to_numpy(), 'dec_pop': population,
+                                    'as_of_date_dec': list(prison_pop_data['as_of_date_dec']) + ['N/A']}, index = states.INDEX)
+    return compact(prison_pop_data)
+
+
+def load_covid_prison_data(prison_pop_data):
+    prison_history = history.ingest('covid_prison_cases', pipeline.COVID_PRISON_DATA_URL)
+    covid_prison_data = states.keyed(history.select(prison_history).reset_index(), 'name').reindex(states.STATE_CODES)
+    covid_prison_data = pd.DataFrame(metrics.prison_metrics(covid_prison_data['total_prisoner_cases'], covid_prison_data['total_prisoner_deaths'],
+                                                            numbers(prison_pop_data['dec_pop'].iloc[:-1])), index = states.INDEX)
+    covid_prison_data.insert(0, 'name', states.STATES['name'].to_numpy())
+    covid_prison_data.insert(3, 'as_of_date', history.latest_date(prison_history))
+    cases, deaths = prison_counts(prison_history)
+    rates = window_rates('Prison_', cases.index, cases.to_numpy(), deaths.to_numpy(), numbers(prison_pop_data['dec_pop'].iloc[:-1]),
+                         [history.latest_date(prison_history)])
+    for column, values in rates.items():
+        covid_prison_data[column] = values[0]
+    return compact(covid_prison_data)
+
+
+def load_covid_data(data_date):
+    covid_data = snapshots.fetch(data_date, pipeline.covid_data_url(data_date))
+    covid_data = states.keyed(covid_data, 'FIPS', by = 'fips').reindex(states.STATE_CODES)
+    covid_data = pd.DataFrame(metrics.state_metrics(covid_data['Confirmed'], covid_data['Deaths'], covid_data['Incident_Rate'],
+                                                    covid_data['Mortality_Rate']), index = states.INDEX)
+    covid_data.insert(0, 'Province_State', states.STATES['name'].to_numpy())
+    for column, values in state_window_rates(load_state_series(), [pd.Timestamp(datetime.strptime(data_date, '%m-%d-%Y'))]).items():
+        covid_data[column] = values[0]
+    return compact(covid_data)
+
+
+# Prison and state rates for every as_of_date in the prison history, indexed by (as_of_date, code)
+# Prison rates for all dates come from one broadcast metric pass over the date x state pivot, and so do state rates,
+# over the JHU reports for those dates: slices of the backfilled cube (daily_reports) where it has the date, otherwise
+# the daily report fetched into the snapshot store, NaN where there is none. Columns match combine(), without as_of_date.
+def load_timeline(prison_pop_data):
+    cases, deaths = prison_counts(history.ingest('covid_prison_cases', pipeline.COVID_PRISON_DATA_URL))
+    population = numbers(prison_pop_data['dec_pop'].iloc[:-1])
+    prison = metrics.prison_metrics(cases.to_numpy(), deaths.to_numpy(), population)
+    prison.update(window_rates('Prison_', cases.index, cases.to_numpy(), deaths.to_numpy(), population, cases.index))
+
+    data_dates = [as_of_date.strftime('%m-%d-%Y') for as_of_date in cases.index]
+    cube = daily_reports.load()
+    reports = np.full((len(data_dates), len(states.STATE_CODES), len(daily_reports.MEASURES)), np.nan)
+    missing = []
+    for i, data_date in enumerate(data_dates):
+        if cube is not None and daily_reports.has(cube, data_date):
+            reports[i] = daily_reports.at(cube, data_date)
+        else:
+            missing.append(data_date)
+    for data_date, path in pipeline.prefetch_daily_reports(missing).items():
+        reports[data_dates.index(data_date)] = daily_reports.parse_report(path)[1]
+    state = metrics.state_metrics(*np.moveaxis(reports, -1, 0))
+    state.update(state_window_rates(load_state_series(), cases.index))
+
+    index = pd.MultiIndex.from_product([cases.index, states.INDEX], names = ['as_of_date', 'code'])
+    timeline = pd.DataFrame({'name': np.tile(states.STATES['name'].to_numpy(), len(cases.index))}, index = index)
+    for column in ['Prison_CR', 'Prison_MR', 'Prison_CFR', 'State_CR', 'State_CFR', 'State_MR'] + WINDOW_COLUMNS:
+        timeline[column] = (prison if column.startswith('Prison_') else state)[column].ravel()
+    return compact(timeline)
+
+
+# Join prison and state figures on the state code rather than on row position
+def combine(covid_prison_data, covid_data):
+    combined_data = states.join(covid_prison_data, covid_data)
+    combined_data = combined_data.drop(columns = ['total_prisoner_cases', 'total_prisoner_deaths', 'Province_State', 'Confirmed', 'Deaths',
+                                                  'population'])
+    return compact(combined_data)
@@ -0,0 +1,263 @@
+import json
+import os
+from collections import Counter, OrderedDict
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Startup profiling
+# With COVID_PRISONS_PROFILE_STARTUP=1 the page times each top-level stage of its first run and prints the breakdown
+# to stderr. `python profiling.py` reports per-module import times (from python -X importtime) for the modules the
+# page pulls in, then the wall-clock time of each cold-start stage in this fresh process, then the memory each frame
+# takes and what one session holds.
+ENABLED = os.environ.get('COVID_PRISONS_PROFILE_STARTUP', '0') not in ('', '0')
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow.parquet', 'plotly.graph_objects', 'plotly.subplots', 'plotly.io', 'streamlit']
+
+# Per-rerun timing
+# Every run of the page script is a Rerun; each top-level stage is a span. When COVID_PRISONS_TIMING_LOG is set, a
+# finished rerun is appended to that file as one JSON line, and ?debug=timing shows the same breakdown in the sidebar.
+LOG_PATH = os.environ.get('COVID_PRISONS_TIMING_LOG')
+DEBUG_PARAM = 'debug'
+DEBUG_VALUE = 'timing'
+
+_start = time.perf_counter()
+_stages = []
+_reported = False
+# Streamlit runs each session's script in its own thread, so the rerun in progress is per thread
+_current = threading.local()
+_log_lock = threading.Lock()
+# Process-wide calls and misses of each cached loader, for the hit rate
+_cache_counts = {}
+# Bytes held by the entries of each cached loader, oldest first, for the memory ceiling in covid-prisons.py
+_cache_sizes = {}
+_cache_lock = threading.Lock()
+
+
+# Time a stage of the first run; a no-op unless profiling is enabled
+@contextmanager
+def stage(name):
+    if not ENABLED or _reported:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages.append((name, start - _start, time.perf_counter() - start))
+
+
+def report(file = sys.stderr):
+    global _reported
+    if _reported or not _stages:
+        return
+    _reported = True
+    print('stage                      starts at   took', file = file)
+    for name, offset, seconds in _stages:
+        print(format(name, '25') + '  ' + format(offset, '8.3f') + 's  ' + format(seconds, '6.3f') + 's', file = file)
+
+
+class Rerun:
+    def __init__(self, page):
+        self.page = page
+        self.time = datetime.now(timezone.utc).isoformat(timespec = 'milliseconds')
+        self.spans = []
+        self.cache_calls = []
+        self.cache_misses = []
+        self._start = time.perf_counter()
+        _current.rerun = self
+
+    # Time a stage of this rerun (and of the startup profile on the first run)
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            with stage(name):
+                yield
+        finally:
+            self.spans.append({'name': name, 'ms': round((time.perf_counter() - start) * 1000, 3)})
+
+    # Close the rerun and append it to the log; returns the record
+    def finish(self, **fields):
+        if getattr(_current, 'rerun', None) is self:
+            del _current.rerun
+        record = {'time': self.time, 'page': self.page, **fields,
+                  'total_ms': round((time.perf_counter() - self._start) * 1000, 3),
+                  'spans': self.spans, 'cache_hits': list((Counter(self.cache_calls) - Counter(self.cache_misses)).elements()),
+                  'cache_misses': self.cache_misses, 'cache_stats': cache_stats(), 'rss_mb': rss_mb()}
+        if LOG_PATH is not None:
+            line = json.dumps(record)
+            with _log_lock:
+                with open(LOG_PATH, 'a') as f:
+                    f.write(line + '\n')
+        return record
+
+
+def _count(name, field):
+    rerun = getattr(_current, 'rerun', None)
+    if rerun is not None:
+        getattr(rerun, 'cache_' + field).append(name)
+    with _cache_lock:
+        counts = _cache_counts.setdefault(name, {'calls': 0, 'misses': 0})
+        counts[field] += 1
+
+
+# Note a lookup in a cached loader; call on entry, or use cached()
+def cache_call(name):
+    _count(name, 'calls')
+
+
+# Note that a cached loader actually ran in the current rerun; call from inside the cached function body
+def cache_miss(name):
+    _count(name, 'misses')
+
+
+# Call a cached function, counting the lookup
+def cached(name, function, *args):
+    cache_call(name)
+    return function(*args)
+
+
+# {name: {'hits', 'misses', 'hit_rate'}} of every cached loader since the process started
+def cache_stats():
+    with _cache_lock:
+        counts = {name: dict(value) for name, value in _cache_counts.items()}
+    return {name: {'hits': value['calls'] - value['misses'], 'misses': value['misses'],
+                   'hit_rate': round((value['calls'] - value['misses']) / value['calls'], 3) if value['calls'] else None}
+            for name, value in sorted(counts.items())}
+
+
+# Note the size of value, which a cached loader is storing under key; only the newest `keep` keys of each loader are
+# counted, since its cache holds at most that many (max_entries)
+def cache_size(name, key, value, keep):
+    size = _nbytes(value)
+    with _cache_lock:
+        sizes = _cache_sizes.setdefault(name, OrderedDict())
+        sizes[key] = size
+        sizes.move_to_end(key)
+        while len(sizes) > keep:
+            sizes.popitem(last = False)
+
+
+# Total size of the entries noted with cache_size
+def cached_bytes():
+    with _cache_lock:
+        return sum(sum(sizes.values()) for sizes in _cache_sizes.values())
+
+
+# Stop counting the entries of the named loaders, once their caches are cleared
+def cache_forget(*names):
+    with _cache_lock:
+        for name in names:
+            _cache_sizes.pop(name, None)
+
+
+# Resident memory of this process in MB, or None where /proc is not available
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+
+
+# query_params is st.query_params
+def debug_enabled(query_params):
+    return DEBUG_VALUE in query_params.get_all(DEBUG_PARAM)
+
+
+# Deep memory in bytes of a frame, an array, or a dict of them (grid values); 0 for anything else
+def _nbytes(value):
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep = True).sum())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    return 0
+
+
+# Memory held by a session's data, as {'frames': {name: bytes}, 'session_bytes': total}; data maps names to the frames
+# and value arrays the session holds, e.g. a dataset.load() result
+def memory_report(data):
+    frames = {name: _nbytes(value) for name, value in data.items()}
+    frames = {name: size for name, size in frames.items() if size}
+    return {'frames': frames, 'session_bytes': sum(frames.values())}
+
+
+# Plain-text breakdown of a finished rerun for the debug panel
+def format_rerun(record):
+    lines = [format(span['name'], '22') + format(span['ms'], '10.1f') + ' ms' for span in record['spans']]
+    lines.append(format('total', '22') + format(record['total_ms'], '10.1f') + ' ms')
+    lines.append('cache hits: ' + (', '.join(record['cache_hits']) or 'none'))
+    lines.append('cache misses: ' + (', '.join(record['cache_misses']) or 'none'))
+    for name, stats in record['cache_stats'].items():
+        lines.append(format(name, '22') + format(stats['hits'], '6') + ' hit ' + format(stats['misses'], '4') + ' miss')
+    if 'memory' in record:
+        for name, size in record['memory']['frames'].items():
+            lines.append(format(name, '22') + format(size / 1024, '10.1f') + ' KB')
+        lines.append(format('session', '22') + format(record['memory']['session_bytes'] / 1024, '10.1f') + ' KB')
+    if record['rss_mb'] is not None:
+        lines.append(format('resident memory', '22') + format(record['rss_mb'], '10.1f') + ' MB')
+    return '\n'.join(lines)
+
+
+# Cumulative import time in seconds of each module, each measured in a fresh interpreter with -X importtime
+def import_times(modules):
+    times = {}
+    for module in modules:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                                capture_output = True, text = True, cwd = os.path.dirname(os.path.abspath(__file__)))
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = line.split('|')
+            if len(parts) == 3 and parts[2].strip() == module:
+                times[module] = int(parts[1]) / 1e6
+    return times
+
+
+def main():
+    global ENABLED, _start
+    ENABLED = True
+    print('module                      import')
+    for module, seconds in sorted(import_times(HEAVY_MODULES + ['pipeline', 'prison_data', 'charts']).items(), key = lambda item: -item[1]):
+        print(format(module, '25') + '  ' + format(seconds, '6.3f') + 's')
+    print()
+
+    _start = time.perf_counter()
+    with stage('import data modules'):
+        import pipeline
+        import prison_data
+    with stage('fetch sources'):
+        data_date, _ = pipeline.prefetch()
+    with stage('load data'):
+        prison_pop_data = prison_data.load_prison_pop_data()
+        covid_prison_data = prison_data.load_covid_prison_data(prison_pop_data)
+        covid_data = prison_data.load_covid_data(data_date)
+        combined_data = prison_data.combine(covid_prison_data, covid_data)
+    with stage('import charts'):
+        import charts
+    with stage('grid values'):
+        grid_values = charts.grid_values(combined_data)
+    with stage('make_grid'):
+        charts.make_grid(grid_values, 'CR', '#F13B3B')
+    with stage('make_bar_chart'):
+        charts.make_bar_chart(combined_data, 'CR', '#F13B3B')
+    report(sys.stdout)
+    print()
+
+    timeline_values = charts.timeline_values(prison_data.load_timeline(prison_pop_data))
+    memory = memory_report({'prison_pop_data': prison_pop_data, 'covid_prison_data': covid_prison_data, 'covid_data': covid_data,
+                            'combined_data': combined_data, 'grid_values': grid_values, 'timeline_values': timeline_values})
+    print('frame                       memory')
+    for name, size in memory['frames'].items():
+        print(format(name, '25') + '  ' + format(size / 1024, '8.1f') + ' KB')
+    print(format('per session', '25') + '  ' + format(memory['session_bytes'] / 1024, '8.1f') + ' KB')
+    print(format('process resident', '25') + '  ' + format(rss_mb() or 0, '8.1f') + ' MB')
+
+
+if __name__ == '__main__':
+    main()
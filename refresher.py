@@ -0,0 +1,77 @@
+import logging
+import os
+import threading
+
+import charts
+import dataset
+import figure_cache
+
+# Background refresher for the Streamlit server process
+# start() launches one daemon thread per process that calls dataset.refresh every REFRESH_INTERVAL seconds (the first
+# time right away). Each new dataset version is built whole off the request path, including the grid map and bar chart
+# of every metric in figure_cache, and only then swapped in, so requests always read a complete version and never wait
+# on the network. The figures with a date slider are left to the first request that asks for them; their inputs (the
+# timeline values) are part of the version. After a cold start the first requests wait only for the frames; the figures
+# and timeline values are built after them. A failed refresh is logged and the current version kept until the next one,
+# which comes after RETRY_INTERVAL seconds while no version has been published yet.
+# COVID_PRISONS_REFRESH_INTERVAL=0 turns the refresher off, and requests check the sources themselves as before.
+REFRESH_INTERVAL = int(os.environ.get('COVID_PRISONS_REFRESH_INTERVAL', dataset.CHECK_INTERVAL))
+RETRY_INTERVAL = int(os.environ.get('COVID_PRISONS_REFRESH_RETRY_INTERVAL', 30))
+GRID_RENDERER = os.environ.get('COVID_PRISONS_GRID_RENDERER', 'subplots')
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+
+
+# Build the grid map and bar chart of every metric into figure_cache, under the keys covid-prisons.py reads them by
+def prepare_figures(data):
+    version = data['dataset_version']
+    make_grid = charts.GRID_RENDERERS[GRID_RENDERER]
+    for metric in charts.ALL_METRICS:
+        color = charts.color(metric)
+        figure_cache.get('grid-' + GRID_RENDERER, metric, version, lambda: make_grid(data['grid_values'], metric, color))
+        figure_cache.get('bar', metric, version, lambda: charts.make_bar_chart(data['combined_data'], metric, color))
+
+
+def _run(interval):
+    while not _stop.is_set():
+        wait = interval
+        try:
+            if dataset.refresh(prepare_figures):
+                logger.info('swapped in dataset version %s', dataset.source()[1])
+        except Exception:
+            logger.exception('background refresh failed; keeping the current dataset version')
+            if not dataset.published():
+                wait = min(interval, RETRY_INTERVAL)
+        _stop.wait(wait)
+
+
+# Start the refresher unless it is running or turned off; returns True if this call started it
+def start(interval = REFRESH_INTERVAL):
+    global _thread
+    with _lock:
+        if interval <= 0 or (_thread is not None and _thread.is_alive()):
+            return False
+        dataset.BACKGROUND = True
+        _stop.clear()
+        _thread = threading.Thread(target = _run, args = (interval,), name = 'dataset-refresher', daemon = True)
+        _thread.start()
+        return True
+
+
+def stop():
+    global _thread
+    with _lock:
+        _stop.set()
+        if _thread is not None:
+            _thread.join()
+        _thread = None
+        dataset.BACKGROUND = False
+
+
+def running():
+    with _lock:
+        return _thread is not None and _thread.is_alive()
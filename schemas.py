@@ -0,0 +1,33 @@
+import re
+
+# Schema registry: for each upstream source, the columns the app reads and the dtype each is parsed as
+# Columns are picked by header name, never by position, so upstream adding, dropping or reordering other columns (the
+# prison-case file has gained vaccine columns, for one) changes nothing; a registered column that disappears is an
+# error naming it. Counts are float64 since upstream leaves gaps; compact dtypes are applied after the metrics
+# (prison_data.compact). The JHU time series are not registered: their day columns grow daily and are found from the
+# header (time_series.py).
+PRISON_POPULATIONS = {'name': 'str', 'dec_pop': 'float64', 'as_of_date_dec': 'str'}
+COVID_PRISON_CASES = {'name': 'str', 'abbreviation': 'str', 'total_prisoner_cases': 'float64', 'total_prisoner_deaths': 'float64',
+                      'as_of_date': 'str'}
+DAILY_REPORT = {'Province_State': 'str', 'Confirmed': 'float64', 'Deaths': 'float64', 'FIPS': 'float64', 'Incident_Rate': 'float64',
+                'Mortality_Rate': 'float64'}
+
+SCHEMAS = {
+    'prison_populations': PRISON_POPULATIONS,
+    'covid_prison_cases': COVID_PRISON_CASES,
+}
+# JHU daily reports are stored under their date, MM-DD-YYYY
+_DAILY_REPORT = re.compile(r'\d\d-\d\d-\d{4}$')
+
+
+# Schema of the snapshot called `name` (see snapshots.py), or None for a source without one
+def schema(name):
+    if name in SCHEMAS:
+        return SCHEMAS[name]
+    if _DAILY_REPORT.match(name):
+        return DAILY_REPORT
+    return None
+
+
+def missing(header, schema):
+    return [column for column in schema if column not in header]
@@ -0,0 +1,36 @@
+import threading
+from concurrent.futures import Future
+
+# Single-flight guard for loaders shared across sessions
+# The first caller of run() for a key calls the function; callers arriving with the same key while it is in flight wait
+# for that call and get its result, or its exception, instead of starting their own. Nothing is kept once the call
+# returns, so a later caller runs the function again; caching the result is up to the caller. A function must not
+# re-enter run() with its own key.
+_lock = threading.Lock()
+_flights = {}
+
+
+def run(key, function, *args):
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Future()
+    if not leader:
+        return flight.result()
+
+    try:
+        flight.set_result(function(*args))
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+    return flight.result()
+
+
+# Keys with a call in flight, for diagnostics
+def in_flight():
+    with _lock:
+        return list(_flights)
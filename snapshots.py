@@ -0,0 +1,220 @@
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from email.utils import formatdate
+
+import pandas as pd
+
+import schemas
+import single_flight
+
+# Local snapshot store for the upstream CSVs
+# Each source is kept on disk as <name>.parquet plus <name>.json with its fetch metadata (url, ETag, Last-Modified,
+# sha256 of the body, fetch time); sources too wide to parse whole are kept as the raw <name>.csv instead (raw = True). Snapshots younger than MAX_AGE seconds are read straight from disk; older ones are
+# revalidated with If-None-Match / If-Modified-Since, so an unchanged source costs one round trip and no parse.
+# Offline mode (COVID_PRISONS_OFFLINE=1) never touches the network and reads only SNAPSHOT_DIR, which can also be a
+# fixture directory of plain <name>.csv files.
+# CSVs are parsed with the dtypes of the source's schema (schemas.py) instead of inferring them; snapshots keep every
+# column, the registered ones typed and the rest as strings, and are read back by column name. Files of at least
+# PYARROW_MIN_BYTES go through pandas' multithreaded pyarrow engine where pyarrow is installed (ENGINE); below that its
+# fixed setup cost (about 5 ms a call) outweighs the faster parse, and the C engine is quicker
+# (benchmarks/csv_parsers.py).
+SNAPSHOT_DIR = os.environ.get('COVID_PRISONS_SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+OFFLINE = os.environ.get('COVID_PRISONS_OFFLINE', '0') not in ('', '0')
+MAX_AGE = int(os.environ.get('COVID_PRISONS_SNAPSHOT_MAX_AGE', 3600))
+TIMEOUT = 30
+ROW_GROUP_SIZE = 5000
+ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+PYARROW_MIN_BYTES = 256 * 1024
+
+
+def _path(name, ext):
+    return os.path.join(SNAPSHOT_DIR, name + ext)
+
+
+def metadata(name):
+    try:
+        with open(_path(name, '.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_metadata(name, meta):
+    fd, tmp = tempfile.mkstemp(dir = SNAPSHOT_DIR, suffix = '.json.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f, indent = 2, sort_keys = True)
+    os.replace(tmp, _path(name, '.json'))
+
+
+# read_csv engine for a CSV source: pyarrow for large local files if it is installed, else C (also for URLs and files)
+def _engine(source):
+    if ENGINE == 'pyarrow' and isinstance(source, str) and os.path.isfile(source) and os.path.getsize(source) >= PYARROW_MIN_BYTES:
+        return 'pyarrow'
+    return 'c'
+
+
+def _write_snapshot(name, body, meta):
+    schema = schemas.schema(name)
+    if schema is None:
+        frame = pd.read_csv(body, engine = _engine(body))
+    else:
+        frame = pd.read_csv(body, dtype = {column: schema.get(column, 'str') for column in columns(body)}, engine = _engine(body))
+    fd, tmp = tempfile.mkstemp(dir = SNAPSHOT_DIR, suffix = '.parquet.tmp')
+    os.close(fd)
+    try:
+        frame.to_parquet(tmp, index = False, row_group_size = ROW_GROUP_SIZE)
+        os.replace(tmp, _path(name, '.parquet'))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    write_metadata(name, meta)
+
+
+def _write_raw(name, body, meta):
+    os.replace(body, _path(name, '.csv'))
+    write_metadata(name, meta)
+
+
+def _local_path(name):
+    for ext in ('.parquet', '.csv'):
+        if os.path.exists(_path(name, ext)):
+            return _path(name, ext)
+    raise FileNotFoundError('No local snapshot for ' + repr(name) + ' in ' + SNAPSHOT_DIR)
+
+
+# Parse a CSV (path, URL or file object) into the columns of schema ({column: dtype}), picked by header name and
+# returned in schema order whatever their order in the file
+def parse_csv(source, schema):
+    try:
+        return pd.read_csv(source, usecols = list(schema), dtype = schema, engine = _engine(source))[list(schema)]
+    except KeyError as e:
+        # The pyarrow engine reports a missing column as a KeyError, the C engine as a ValueError
+        raise ValueError(str(source) + ' has no column ' + str(e)) from e
+
+
+# A snapshot (or any CSV path or URL) as a DataFrame: every column, or the columns of schema with its dtypes
+def read(path, schema = None):
+    if schema is None:
+        return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path, engine = _engine(path))
+    if not path.endswith('.parquet'):
+        return parse_csv(path, schema)
+    absent = schemas.missing(columns(path), schema)
+    if absent:
+        raise ValueError(path + ' has no column ' + ', '.join(absent))
+    # Snapshots stored before the schema existed have inferred dtypes; astype is a no-op for typed ones
+    return pd.read_parquet(path, columns = list(schema)).astype(schema)
+
+
+# Column names of a snapshot, without reading its rows
+def columns(path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows = 0).columns)
+
+
+# Read a snapshot in chunks of at most chunksize rows, so memory stays bounded by the chunk rather than the file
+# dtype ({column: dtype}) applies to CSV files; Parquet snapshots keep the types they were stored with
+def iter_chunks(path, columns, chunksize, dtype = None):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size = chunksize, columns = columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols = columns, chunksize = chunksize, dtype = dtype)
+
+
+# Identifies the content of a snapshot: the body's sha256, or size and mtime for files dropped in by hand
+def version(name):
+    meta = metadata(name)
+    if meta is not None and meta.get('sha256'):
+        return meta['sha256']
+    stat = os.stat(_local_path(name))
+    return str(stat.st_size) + '-' + str(int(stat.st_mtime))
+
+
+# Download url to a temporary file, revalidating against the stored metadata
+# Returns (path, meta), or (None, meta) when the server answered 304 Not Modified
+def _download(url, meta):
+    request = urllib.request.Request(url)
+    if meta is not None and meta.get('url') == url:
+        if meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        if meta.get('last_modified'):
+            request.add_header('If-Modified-Since', meta['last_modified'])
+    try:
+        response = urllib.request.urlopen(request, timeout = TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, dict(meta, fetched_at = time.time())
+        raise
+
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir = SNAPSHOT_DIR, suffix = '.csv.tmp')
+    with response, os.fdopen(fd, 'wb') as f:
+        for block in iter(lambda: response.read(1 << 16), b''):
+            digest.update(block)
+            f.write(block)
+    return tmp, {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified') or formatdate(usegmt = True),
+        'sha256': digest.hexdigest(),
+        'fetched_at': time.time(),
+    }
+
+
+def is_fresh(name, url, max_age = None, raw = False):
+    max_age = MAX_AGE if max_age is None else max_age
+    meta = metadata(name)
+    return (meta is not None and meta.get('url') == url and os.path.exists(_path(name, '.csv' if raw else '.parquet'))
+            and time.time() - meta.get('fetched_at', 0) < max_age)
+
+
+# Make sure the snapshot of source `name` is present and no older than max_age, refreshing it from url if needed
+# With raw, the body is stored as downloaded (<name>.csv) rather than parsed into Parquet, for readers that stream it
+# Returns the local path of the snapshot. Concurrent refreshes of one source share a single download (single_flight).
+def refresh(name, url, max_age = None, raw = False):
+    if OFFLINE:
+        return _local_path(name)
+    return single_flight.run(('snapshot', name), _refresh, name, url, max_age, raw)
+
+
+def _refresh(name, url, max_age, raw):
+    max_age = MAX_AGE if max_age is None else max_age
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok = True)
+    ext = '.csv' if raw else '.parquet'
+    meta = metadata(name)
+    have_local = meta is not None and meta.get('url') == url and os.path.exists(_path(name, ext))
+    if is_fresh(name, url, max_age, raw):
+        return _path(name, ext)
+
+    try:
+        tmp, new_meta = _download(url, meta if have_local else None)
+    except (urllib.error.URLError, OSError):
+        # Serve the stale snapshot rather than failing the page when upstream is unreachable
+        if have_local:
+            return _path(name, ext)
+        raise
+
+    try:
+        if tmp is not None and not (have_local and new_meta['sha256'] == meta.get('sha256')):
+            (_write_raw if raw else _write_snapshot)(name, tmp, new_meta)
+        else:
+            write_metadata(name, new_meta)
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+    return _path(name, ext)
+
+
+# Return the snapshot of source `name` as a DataFrame, in the columns and dtypes of its schema if it has one
+def fetch(name, url, max_age = None):
+    return read(refresh(name, url, max_age), schemas.schema(name))
@@ -0,0 +1,45 @@
+import pandas as pd
+
+# Canonical state table: every source is keyed on the two-letter code before it is joined, instead of relying on
+# row positions lining up. Rows are in display order (alphabetical by name, NATIONWIDE last); INDEX is built once and
+# gives O(1) code -> row lookups for the grid and bar charts.
+STATES = pd.DataFrame([
+    ('Alabama', 'AL', 1), ('Alaska', 'AK', 2), ('Arizona', 'AZ', 4), ('Arkansas', 'AR', 5), ('California', 'CA', 6),
+    ('Colorado', 'CO', 8), ('Connecticut', 'CT', 9), ('Delaware', 'DE', 10), ('Florida', 'FL', 12), ('Georgia', 'GA', 13),
+    ('Hawaii', 'HI', 15), ('Idaho', 'ID', 16), ('Illinois', 'IL', 17), ('Indiana', 'IN', 18), ('Iowa', 'IA', 19),
+    ('Kansas', 'KS', 20), ('Kentucky', 'KY', 21), ('Louisiana', 'LA', 22), ('Maine', 'ME', 23), ('Maryland', 'MD', 24),
+    ('Massachusetts', 'MA', 25), ('Michigan', 'MI', 26), ('Minnesota', 'MN', 27), ('Mississippi', 'MS', 28), ('Missouri', 'MO', 29),
+    ('Montana', 'MT', 30), ('Nebraska', 'NE', 31), ('Nevada', 'NV', 32), ('New Hampshire', 'NH', 33), ('New Jersey', 'NJ', 34),
+    ('New Mexico', 'NM', 35), ('New York', 'NY', 36), ('North Carolina', 'NC', 37), ('North Dakota', 'ND', 38), ('Ohio', 'OH', 39),
+    ('Oklahoma', 'OK', 40), ('Oregon', 'OR', 41), ('Pennsylvania', 'PA', 42), ('Rhode Island', 'RI', 44), ('South Carolina', 'SC', 45),
+    ('South Dakota', 'SD', 46), ('Tennessee', 'TN', 47), ('Texas', 'TX', 48), ('Utah', 'UT', 49), ('Vermont', 'VT', 50),
+    ('Virginia', 'VA', 51), ('Washington', 'WA', 53), ('West Virginia', 'WV', 54), ('Wisconsin', 'WI', 55), ('Wyoming', 'WY', 56),
+    ('NATIONWIDE', 'NAT', 0),
+], columns = ['name', 'code', 'fips'])
+
+INDEX = pd.Index(STATES['code'], name = 'code')
+STATE_CODES = INDEX[:-1]
+# Categorical dtypes of the code index and name columns of the compact frames (see prison_data.compact)
+CODE_DTYPE = pd.CategoricalDtype(STATES['code'])
+NAME_DTYPE = pd.CategoricalDtype(STATES['name'])
+_CODE_BY_NAME = dict(zip(STATES['name'], STATES['code']))
+_CODE_BY_FIPS = dict(zip(STATES['fips'][:-1], STATES['code'][:-1]))
+
+
+def codes(values, by = 'name'):
+    values = pd.Series(values)
+    if by == 'fips':
+        return pd.to_numeric(values, errors = 'coerce').map(_CODE_BY_FIPS)
+    return values.str.strip().map(_CODE_BY_NAME)
+
+
+# Index a source frame by state code; rows that are not one of the 50 states or NATIONWIDE (territories, D.C.,
+# cruise ships, federal prisons) drop out here
+def keyed(frame, column, by = 'name'):
+    frame = frame.assign(code = codes(frame[column], by).values)
+    return frame.dropna(subset = ['code']).set_index('code')
+
+
+# Join code-indexed frames in one aligned concat, in canonical order
+def join(*frames):
+    return pd.concat(frames, axis = 1).reindex(INDEX)
@@ -0,0 +1,82 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import snapshots
+import states
+
+# JHU US time series (time_series_covid19_confirmed_US.csv / deaths_US.csv) rolled up to states
+# Each file has one row per county (about 3,300) and one column per day since 1/22/20 (1,000+), so it is never loaded
+# as one wide frame: the raw CSV is read CHUNKSIZE rows at a time with the day columns parsed as int32, and each chunk's
+# counties are added into their state's row of a (states, days) array in one vectorized scatter-add. Peak
+# memory is one chunk plus the state totals. Territories, cruise ships and D.C. drop out like everywhere else;
+# 'Unassigned' and 'Out of <state>' rows count towards their state, as they do in the JHU daily reports.
+MEASURES = {'Confirmed': 'confirmed', 'Deaths': 'deaths'}
+CHUNKSIZE = 1000
+DATE_FORMAT = '%m/%d/%y'
+
+
+# Day columns of a time-series header, in file order
+def _day_columns(header):
+    found = pd.to_datetime(pd.Series(header), format = DATE_FORMAT, errors = 'coerce')
+    return [column for column, day in zip(header, found) if not pd.isna(day)]
+
+
+# Stream one time-series file into state totals
+# Returns {'dates': DatetimeIndex, 'values': (days, states.STATE_CODES) int32 array, 'population': (states,) int64
+# array, or None for the confirmed file, which has no Population column}
+def load_measure(path, chunksize = CHUNKSIZE):
+    header = snapshots.columns(path)
+    days = _day_columns(header)
+    population = 'Population' in header
+    columns = ['Province_State'] + (['Population'] if population else []) + days
+    totals = np.zeros((len(states.STATE_CODES), len(days)), dtype = np.int64)
+    populations = np.zeros(len(states.STATE_CODES), dtype = np.int64)
+    dtype = dict.fromkeys(days, np.int32)
+    dtype['Province_State'] = str
+    for chunk in snapshots.iter_chunks(path, columns, chunksize, dtype = dtype):
+        positions = states.STATE_CODES.get_indexer(states.codes(chunk['Province_State']))
+        keep = positions >= 0
+        # Unbuffered scatter-add of each county row into its state's row: the group-sum over the whole chunk in one call
+        np.add.at(totals, positions[keep], chunk[days].to_numpy(dtype = np.int64)[keep])
+        if population:
+            np.add.at(populations, positions[keep], chunk['Population'].to_numpy(dtype = np.int64)[keep])
+    return {
+        'dates': pd.DatetimeIndex(pd.to_datetime(days, format = DATE_FORMAT), name = 'date'),
+        'values': np.ascontiguousarray(totals.T, dtype = np.int32),
+        'population': populations if population else None,
+    }
+
+
+# Both measures as state x date arrays on the same days: {'dates', 'Confirmed', 'Deaths', 'population'}
+def load(chunksize = CHUNKSIZE):
+    series = {}
+    for measure, name in MEASURES.items():
+        path = snapshots.refresh(pipeline.time_series_name(name), pipeline.time_series_url(name), raw = True)
+        series[measure] = load_measure(path, chunksize)
+    dates = series['Confirmed']['dates'].intersection(series['Deaths']['dates'])
+    return {
+        'dates': dates,
+        'Confirmed': series['Confirmed']['values'][series['Confirmed']['dates'].get_indexer(dates)],
+        'Deaths': series['Deaths']['values'][series['Deaths']['dates'].get_indexer(dates)],
+        'population': series['Deaths']['population'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Roll the JHU US time series up to states')
+    parser.add_argument('--chunksize', type = int, default = CHUNKSIZE, help = 'county rows per chunk')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    series = load(args.chunksize)
+    print(str(len(series['dates'])) + ' days (' + series['dates'][0].strftime('%m-%d-%Y') + ' to ' + series['dates'][-1].strftime('%m-%d-%Y')
+          + ') x ' + str(series['Confirmed'].shape[1]) + ' states in ' + format(time.perf_counter() - start, '.2f') + 's')
+
+
+if __name__ == '__main__':
+    sys.exit(main())